@@ -0,0 +1,454 @@
+# benchmark_storage.py
+# I use this script to compare the storage backends with a lot of fake
+# bookings. It never touches the real bookings.json: every run works in
+# a temporary folder that is deleted afterwards.
+#
+#     python benchmark_storage.py                 (10k, 100k and 1M bookings)
+#     python benchmark_storage.py 10000 50000     (my own sizes)
+#     python benchmark_storage.py bulk [sizes]    (bulk updates vs a loop)
+#     python benchmark_storage.py memory [sizes]  (dicts vs Booking records)
+#     python benchmark_storage.py columns [sizes] (report scans: dicts vs columns)
+#     python benchmark_storage.py search [sizes]  (availability: strptime vs parsed dates)
+#     python benchmark_storage.py rooms [sizes]   (filter_rooms: dict copies vs views)
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import booking_columns
+import booking_storage
+import rooms_data
+from booking_record import Booking
+from rooms_data import ROOMS
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+LOOKUPS = 1000
+SEARCHES = 100
+WRITES = 5
+BULK_SIZES = (10_000, 100_000)
+BULK_CHANGES = 50
+MEMORY_SIZES = (1_000_000,)
+COLUMN_SIZES = (100_000, 1_000_000)
+COLUMN_REPEAT = 5
+SEARCH_SIZES = (100_000,)
+SEARCH_REPEAT = 5
+ROOM_SIZES = (1_000, 30_000)
+ROOM_REPEAT = 20
+
+
+def iter_fake_bookings(count, seed=18):
+    """I yield count fake bookings spread over the physical rooms."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    for i in range(count):
+        room = rng.choice(ROOMS)
+        check_in = start + timedelta(days=rng.randint(0, 730))
+        nights = rng.randint(1, 14)
+        yield {
+            "first_name": "Guest",
+            "last_name": f"Name{i % 5000}",
+            "email": f"guest{i}@example.com",
+            "phone": "1234567890",
+            "adults": 2,
+            "children": 0,
+            "room_type": room["short_type"],
+            "room_name": f"{room['name']} ({room['room_number']})",
+            "room_number": room["room_number"],
+            "check_in": check_in.isoformat(),
+            "check_out": (check_in + timedelta(days=nights)).isoformat(),
+            "nights": nights,
+            "breakfast": False,
+            "shuttle": False,
+            "total_price": float(room["price"]) * nights,
+            "payment_last4": "0000",
+            "status": "Cancelled" if rng.random() < 0.1 else "Confirmed",
+            "confirmation_code": f"{i:08X}",
+            "created_at": check_in.isoformat(),
+        }
+
+
+def make_bookings(count, seed=18):
+    """I build a list of count fake bookings."""
+    return list(iter_fake_bookings(count, seed))
+
+
+def use_folder(folder):
+    """I point booking_storage at files inside folder."""
+    booking_storage.DB_FILE = os.path.join(folder, "bookings.json")
+    booking_storage.SQLITE_FILE = os.path.join(folder, "bookings.sqlite3")
+    booking_storage.ARCHIVE_DIR = os.path.join(folder, "archive")
+    booking_storage.invalidate()
+
+
+def timed(func, repeat=1):
+    """I run func repeat times and return the average time in milliseconds."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def report(size, backend, operation, ms):
+    print(f"{size:>9,}  {backend:<8} {operation:<28} {ms:>12.3f} ms")
+
+
+def bench_backend(backend, bookings):
+    """I time the public booking_storage functions for one backend."""
+    size = len(bookings)
+    folder = tempfile.mkdtemp(prefix="tvxk_bench_")
+    default_backend = booking_storage.STORAGE_BACKEND
+    try:
+        use_folder(folder)
+        booking_storage.set_backend(backend)
+        report(size, backend, "initial save (whole list)",
+               timed(lambda: booking_storage.save_bookings(bookings)))
+
+        # Reading it back once is what the app pays on the first search.
+        booking_storage.invalidate()
+        report(size, backend, "first load",
+               timed(booking_storage.load_bookings))
+
+        rng = random.Random(7)
+        samples = [rng.choice(bookings) for _ in range(LOOKUPS)]
+        keys = iter([(b["last_name"], b["confirmation_code"]) for b in samples])
+        report(size, backend, "find_booking_by_code",
+               timed(lambda: booking_storage.find_booking_by_code(*next(keys)),
+                     LOOKUPS))
+
+        stays = iter([(b["check_in"], b["check_out"]) for b in samples])
+        report(size, backend, "get_unavailable_room_numbers",
+               timed(lambda: booking_storage.get_unavailable_room_numbers(
+                   *next(stays)), SEARCHES))
+
+        report(size, backend, "count_confirmed_by_room_type",
+               timed(lambda: booking_storage.count_confirmed_by_room_type(
+                   "Suite"), SEARCHES))
+
+        new_bookings = iter(make_bookings(WRITES, seed=99))
+        report(size, backend, "add_booking",
+               timed(lambda: booking_storage.add_booking(next(new_bookings)),
+                     WRITES))
+
+        keys = iter([(b["last_name"], b["confirmation_code"]) for b in samples])
+        report(size, backend, "update_booking",
+               timed(lambda: booking_storage.update_booking(
+                   *next(keys), {"email": "new@example.com"}), WRITES))
+        written = booking_storage.write_stats()["update_booking"]["last_bytes"]
+        print(f"{size:>9,}  {backend:<8} {'update_booking bytes written':<28} {written:>12,} B")
+    finally:
+        booking_storage.set_backend(default_backend)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_bulk(backend, bookings):
+    """
+    I compare cancelling BULK_CHANGES bookings one by one with
+    cancel_booking() against one cancel_bookings() call, and print the
+    throughput of both.
+    """
+    size = len(bookings)
+    folder = tempfile.mkdtemp(prefix="tvxk_bench_")
+    default_backend = booking_storage.STORAGE_BACKEND
+    try:
+        use_folder(folder)
+        booking_storage.set_backend(backend)
+        booking_storage.save_bookings(bookings)
+
+        keys = [(b["last_name"], b["confirmation_code"]) for b in bookings]
+        loop_keys = keys[:BULK_CHANGES]
+        bulk_keys = keys[BULK_CHANGES:2 * BULK_CHANGES]
+
+        def run_loop():
+            for last_name, code in loop_keys:
+                booking_storage.cancel_booking(last_name, code)
+
+        loop_ms = timed(run_loop)
+        bulk_ms = timed(lambda: booking_storage.cancel_bookings(bulk_keys))
+        for label, ms in (("cancel_booking loop", loop_ms),
+                          ("cancel_bookings (one call)", bulk_ms)):
+            per_second = BULK_CHANGES / (ms / 1000) if ms else float("inf")
+            print(f"{size:>9,}  {backend:<8} {label:<28} {ms:>12.3f} ms"
+                  f"  {per_second:>12,.0f} changes/s")
+    finally:
+        booking_storage.set_backend(default_backend)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def traced_size(build):
+    """I return the list build() makes and how many bytes it holds on to."""
+    tracemalloc.start()
+    try:
+        result = build()
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def iter_json_bookings(size, batch=1000):
+    """
+    I yield the fake bookings after a trip through json, a batch at a time.
+    Like json.load on the real file, the key strings are shared inside a
+    batch, but no value string is shared by accident between bookings.
+    """
+    fakes = iter_fake_bookings(size)
+    while True:
+        chunk = [b for _, b in zip(range(batch), fakes)]
+        if not chunk:
+            return
+        yield from json.loads(json.dumps(chunk))
+
+
+def bench_memory(size):
+    """
+    I compare how much memory size bookings take as plain dicts (the way
+    json.load gives them to me) and as the Booking records the cache keeps.
+    """
+    def as_dicts():
+        return list(iter_json_bookings(size))
+
+    def as_records():
+        return [Booking.from_dict(b) for b in iter_json_bookings(size)]
+
+    results = []
+    for label, build in (("dicts", as_dicts), ("Booking records", as_records)):
+        bookings, used = traced_size(build)
+        del bookings
+        results.append(used)
+        print(f"{size:>9,}  {label:<28} {used / 2**20:>12.1f} MiB"
+              f"  {used / size:>8.0f} bytes/booking")
+    print(f"{size:>9,}  records use {results[1] / results[0]:.0%} of the dict memory")
+
+
+def dict_count_confirmed(bookings, room_type):
+    """The old loop of count_confirmed_by_room_type over plain dicts."""
+    count = 0
+    for booking in bookings:
+        b_type = str(booking.get("room_type", ""))
+        status = booking.get("status", "Confirmed")
+        if b_type == room_type and status == "Confirmed":
+            count += 1
+    return count
+
+
+def dict_occupied_nights(bookings, start, end):
+    """The nights per room inside [start, end), looping over plain dicts."""
+    totals = {}
+    for booking in bookings:
+        if booking.get("status") == "Cancelled" or not booking.get("room_number"):
+            continue
+        b_in = date.fromisoformat(booking["check_in"]).toordinal()
+        b_out = date.fromisoformat(booking["check_out"]).toordinal()
+        nights = min(b_out, end) - max(b_in, start)
+        if nights > 0:
+            room_number = str(booking["room_number"])
+            totals[room_number] = totals.get(room_number, 0) + nights
+    return totals
+
+
+def bench_columns(size):
+    """
+    I compare two report scans over the plain dicts with the same scans
+    over the column view from booking_storage.booking_columns().
+    """
+    bookings = make_bookings(size)
+    start = date(2025, 1, 1).toordinal()
+    end = date(2025, 4, 1).toordinal()
+    engine = "numpy" if booking_columns.HAS_NUMPY else "array"
+
+    folder = tempfile.mkdtemp(prefix="tvxk_bench_")
+    try:
+        use_folder(folder)
+        booking_storage.save_bookings(bookings)
+        build_ms = timed(booking_storage.booking_columns)
+        columns = booking_storage.booking_columns()
+        print(f"{size:>9,}  {'build columns':<28} {build_ms:>12.3f} ms")
+
+        scans = (
+            ("count_confirmed",
+             lambda: dict_count_confirmed(bookings, "Suite"),
+             lambda: columns.count_confirmed("Suite")),
+            ("occupied_nights (90 days)",
+             lambda: dict_occupied_nights(bookings, start, end),
+             lambda: columns.occupied_nights(start, end)),
+        )
+        for label, with_dicts, with_columns in scans:
+            assert with_dicts() == with_columns()
+            dict_ms = timed(with_dicts, COLUMN_REPEAT)
+            column_ms = timed(with_columns, COLUMN_REPEAT)
+            print(f"{size:>9,}  {label:<28} dicts {dict_ms:>10.3f} ms"
+                  f"  columns ({engine}) {column_ms:>10.3f} ms"
+                  f"  {dict_ms / column_ms:>6.1f}x")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def strptime_unavailable(bookings, check_in, check_out):
+    """The old get_unavailable_room_numbers: strptime on every booking."""
+    unavailable = set()
+    req_in = datetime.strptime(check_in, "%Y-%m-%d").date()
+    req_out = datetime.strptime(check_out, "%Y-%m-%d").date()
+    for b in bookings:
+        if b.get("status") == "Cancelled":
+            continue
+        r_num = b.get("room_number")
+        if not r_num:
+            continue
+        try:
+            b_in = datetime.strptime(b.get("check_in", ""), "%Y-%m-%d").date()
+            b_out = datetime.strptime(b.get("check_out", ""), "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        if req_in < b_out and req_out > b_in:
+            unavailable.add(str(r_num))
+    return unavailable
+
+
+def bench_search(size):
+    """
+    I time one availability search over size bookings: the old strptime
+    loop, the streaming read (dates parsed once per distinct string) and
+    the cached interval index.
+    """
+    bookings = make_bookings(size)
+    stay = ("2025-06-01", "2025-06-04")
+
+    folder = tempfile.mkdtemp(prefix="tvxk_bench_")
+    try:
+        use_folder(folder)
+        booking_storage.save_bookings(bookings)
+        expected = strptime_unavailable(bookings, *stay)
+
+        def streamed():
+            booking_storage.invalidate()
+            return booking_storage.get_unavailable_room_numbers(*stay)
+
+        def indexed():
+            return booking_storage.get_unavailable_room_numbers(*stay)
+
+        booking_storage.STREAM_COLD_READS = True
+        try:
+            assert streamed() == expected
+            stream_ms = timed(streamed, SEARCH_REPEAT)
+        finally:
+            booking_storage.STREAM_COLD_READS = False
+        booking_storage.load_bookings()
+        assert indexed() == expected
+
+        strptime_ms = timed(lambda: strptime_unavailable(bookings, *stay), SEARCH_REPEAT)
+        index_ms = timed(indexed, SEARCHES)
+        for label, ms in (("strptime every booking", strptime_ms),
+                          ("stream, parsed dates", stream_ms),
+                          ("cached index", index_ms)):
+            print(f"{size:>9,}  {label:<28} {ms:>12.3f} ms"
+                  f"  {strptime_ms / ms:>10.1f}x")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def make_rooms(count):
+    """I build count physical rooms by repeating ROOMS with new room numbers."""
+    return [dict(ROOMS[i % len(ROOMS)], room_number=str(1000 + i)) for i in range(count)]
+
+
+def copied_results(views):
+    """The old filter_rooms output: one dict copy per match, name built right away."""
+    results = []
+    for view in views:
+        room = view._room
+        room_copy = room.copy()
+        room_copy["name"] = f"{room['name']} ({room.get('room_number', 'N/A')})"
+        results.append(room_copy)
+    return results
+
+
+def traced_allocations(func):
+    """I return how many memory blocks and bytes func() allocated (and kept)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = func()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in diff)
+    size = sum(stat.size_diff for stat in diff)
+    del result
+    return blocks, size
+
+
+def bench_rooms(size):
+    """
+    I compare one filter_rooms search (search cache turned off) that
+    returns the shared RoomView objects with the same search followed by
+    the dict copies the old version made for every match.
+    """
+    filters = {"Room": [], "Floor": "", "MinPrice": "", "MaxPrice": ""}
+    old_rooms = rooms_data.ROOMS
+    old_cache_size = rooms_data.SEARCH_CACHE_SIZE
+    folder = tempfile.mkdtemp(prefix="tvxk_bench_")
+    try:
+        use_folder(folder)
+        rooms_data.set_rooms(make_rooms(size))
+        rooms_data.SEARCH_CACHE_SIZE = 0
+
+        def with_views():
+            return rooms_data.filter_rooms(filters)
+
+        def with_copies():
+            return copied_results(rooms_data.filter_rooms(filters))
+
+        for label, search in (("dict copies", with_copies), ("views", with_views)):
+            search()
+            ms = timed(search, ROOM_REPEAT)
+            blocks, used = traced_allocations(search)
+            print(f"{size:>9,}  {label:<28} {ms:>10.3f} ms"
+                  f"  {blocks:>9,} blocks  {used / 1024:>10.1f} KiB")
+    finally:
+        rooms_data.set_rooms(old_rooms)
+        rooms_data.SEARCH_CACHE_SIZE = old_cache_size
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main(argv):
+    if argv and argv[0] == "memory":
+        for size in [int(arg) for arg in argv[1:]] or list(MEMORY_SIZES):
+            bench_memory(size)
+        return
+    if argv and argv[0] == "columns":
+        for size in [int(arg) for arg in argv[1:]] or list(COLUMN_SIZES):
+            bench_columns(size)
+        return
+    if argv and argv[0] == "rooms":
+        for size in [int(arg) for arg in argv[1:]] or list(ROOM_SIZES):
+            bench_rooms(size)
+        return
+    if argv and argv[0] == "search":
+        for size in [int(arg) for arg in argv[1:]] or list(SEARCH_SIZES):
+            bench_search(size)
+        return
+
+    bench = bench_backend
+    default_sizes = DEFAULT_SIZES
+    if argv and argv[0] == "bulk":
+        bench = bench_bulk
+        default_sizes = BULK_SIZES
+        argv = argv[1:]
+
+    sizes = [int(arg) for arg in argv] or list(default_sizes)
+    for size in sizes:
+        bookings = make_bookings(size)
+        for backend in ("json", "journal", "sqlite"):
+            bench(backend, list(bookings))
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
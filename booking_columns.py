@@ -0,0 +1,209 @@
+# booking_columns.py
+# This is a column view of the bookings for reports (occupancy, revenue,
+# how many rooms of a type are sold). Instead of one object per booking I
+# keep one compact array per field, so a report only walks the few
+# numbers it needs:
+#   room         array('i')  index into room_numbers (-1 = no room number)
+#   room_type    array('i')  index into room_types
+#   check_in     array('i')  day ordinal (0 = missing or broken date)
+#   check_out    array('i')  day ordinal (0 = missing or broken date)
+#   total_price  array('d')
+#   status       bytearray   STATUS_CONFIRMED / STATUS_CANCELLED / STATUS_OTHER
+#
+# booking_storage puts the archived bookings in the first rows and then
+# one row per position of its cached list, and keeps those rows up to
+# date when bookings change.
+# With NumPy installed the queries run on the arrays without copying them,
+# otherwise I loop over them in plain Python.
+
+from array import array
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+STATUS_CONFIRMED = 0
+STATUS_CANCELLED = 1
+STATUS_OTHER = 2
+
+NO_DATE = 0
+
+
+def _status_code(status):
+    """I turn a status string into its byte (no status means confirmed)."""
+    if status == "Confirmed":
+        return STATUS_CONFIRMED
+    if status == "Cancelled":
+        return STATUS_CANCELLED
+    return STATUS_OTHER
+
+
+class BookingColumns:
+    """I hold the bookings as parallel arrays, one row per booking."""
+
+    def __init__(self):
+        self.room_numbers = []
+        self.room_types = []
+        self._room_ids = {}
+        self._type_ids = {}
+
+        self.room = array("i")
+        self.room_type = array("i")
+        self.check_in = array("i")
+        self.check_out = array("i")
+        self.total_price = array("d")
+        self.status = bytearray()
+
+    def __len__(self):
+        return len(self.status)
+
+    def _room_id(self, room_number):
+        if not room_number:
+            return -1
+        room_number = str(room_number)
+        if room_number not in self._room_ids:
+            self._room_ids[room_number] = len(self.room_numbers)
+            self.room_numbers.append(room_number)
+        return self._room_ids[room_number]
+
+    def _type_id(self, room_type):
+        room_type = str(room_type)
+        if room_type not in self._type_ids:
+            self._type_ids[room_type] = len(self.room_types)
+            self.room_types.append(room_type)
+        return self._type_ids[room_type]
+
+    def put(self, position, booking, check_in, check_out):
+        """
+        I write the row of one booking. position may be the next free row
+        (then I append) or an existing one (then I overwrite it).
+        check_in and check_out are day ordinals or None.
+        """
+        if booking is None:
+            # Not a booking at all: a row that no query ever counts.
+            row = (-1, -1, NO_DATE, NO_DATE, 0.0, STATUS_CANCELLED)
+        else:
+            try:
+                price = float(booking.get("total_price", 0) or 0)
+            except (TypeError, ValueError):
+                price = 0.0
+            row = (
+                self._room_id(booking.get("room_number")),
+                self._type_id(booking.get("room_type", "")),
+                check_in or NO_DATE,
+                check_out or NO_DATE,
+                price,
+                _status_code(booking.get("status", "Confirmed")),
+            )
+
+        columns = (self.room, self.room_type, self.check_in, self.check_out,
+                   self.total_price, self.status)
+        if position == len(self):
+            for column, value in zip(columns, row):
+                column.append(value)
+        else:
+            for column, value in zip(columns, row):
+                column[position] = value
+
+    def _numpy_columns(self):
+        """
+        I wrap the arrays as NumPy arrays without copying them. The views
+        must not outlive the query, because an array with a live view
+        cannot grow anymore.
+        """
+        return (np.frombuffer(self.room, dtype=np.intc),
+                np.frombuffer(self.room_type, dtype=np.intc),
+                np.frombuffer(self.check_in, dtype=np.intc),
+                np.frombuffer(self.check_out, dtype=np.intc),
+                np.frombuffer(self.total_price, dtype=np.double),
+                np.frombuffer(self.status, dtype=np.uint8))
+
+    def count_confirmed(self, room_type):
+        """I count the confirmed bookings of one room type."""
+        type_id = self._type_ids.get(room_type)
+        if type_id is None or not len(self):
+            return 0
+
+        if HAS_NUMPY:
+            _room, types, _in, _out, _price, status = self._numpy_columns()
+            return int(np.count_nonzero((types == type_id) & (status == STATUS_CONFIRMED)))
+
+        count = 0
+        for t, s in zip(self.room_type, self.status):
+            if t == type_id and s == STATUS_CONFIRMED:
+                count += 1
+        return count
+
+    def unavailable_rooms(self, req_in, req_out):
+        """
+        I return the room numbers with a non-cancelled stay overlapping
+        [req_in, req_out) (day ordinals), like get_unavailable_room_numbers.
+        """
+        if not len(self):
+            return set()
+
+        if HAS_NUMPY:
+            room, _types, b_in, b_out, _price, status = self._numpy_columns()
+            mask = ((status != STATUS_CANCELLED) & (room >= 0)
+                    & (b_in != NO_DATE) & (b_out != NO_DATE)
+                    & (b_in < req_out) & (b_out > req_in))
+            return {self.room_numbers[i] for i in np.unique(room[mask]).tolist()}
+
+        found = set()
+        for r, b_in, b_out, s in zip(self.room, self.check_in, self.check_out, self.status):
+            # Overlap Logic: (StartA < EndB) and (EndA > StartB)
+            if (r >= 0 and s != STATUS_CANCELLED and b_in != NO_DATE
+                    and b_out != NO_DATE and req_in < b_out and req_out > b_in):
+                found.add(r)
+        return {self.room_numbers[r] for r in found}
+
+    def occupied_nights(self, start, end):
+        """
+        I return {room_number: nights} of the non-cancelled stays inside
+        [start, end) (day ordinals). Rooms without a night are left out.
+        """
+        if not len(self):
+            return {}
+
+        if HAS_NUMPY:
+            room, _types, b_in, b_out, _price, status = self._numpy_columns()
+            nights = np.minimum(b_out, end) - np.maximum(b_in, start)
+            mask = ((status != STATUS_CANCELLED) & (room >= 0)
+                    & (b_in != NO_DATE) & (b_out != NO_DATE) & (nights > 0))
+            totals = np.bincount(room[mask], weights=nights[mask],
+                                 minlength=len(self.room_numbers))
+            return {self.room_numbers[i]: int(n)
+                    for i, n in enumerate(totals.tolist()) if n}
+
+        totals = {}
+        for r, b_in, b_out, s in zip(self.room, self.check_in, self.check_out, self.status):
+            if r < 0 or s == STATUS_CANCELLED or b_in == NO_DATE or b_out == NO_DATE:
+                continue
+            nights = min(b_out, end) - max(b_in, start)
+            if nights > 0:
+                totals[r] = totals.get(r, 0) + nights
+        return {self.room_numbers[r]: n for r, n in totals.items()}
+
+    def revenue_by_room_type(self, start, end):
+        """
+        I return {room_type: total_price sum} of the confirmed bookings
+        that check in inside [start, end) (day ordinals).
+        """
+        if not len(self):
+            return {}
+
+        if HAS_NUMPY:
+            _room, types, b_in, _out, price, status = self._numpy_columns()
+            mask = (status == STATUS_CONFIRMED) & (b_in >= start) & (b_in < end) & (b_in != NO_DATE)
+            totals = np.bincount(types[mask], weights=price[mask],
+                                 minlength=len(self.room_types))
+            return {self.room_types[i]: total
+                    for i, total in enumerate(totals.tolist()) if total}
+
+        totals = {}
+        for t, b_in, p, s in zip(self.room_type, self.check_in, self.total_price, self.status):
+            if s == STATUS_CONFIRMED and b_in != NO_DATE and start <= b_in < end:
+                totals[t] = totals.get(t, 0.0) + p
+        return {self.room_types[t]: total for t, total in totals.items() if total}
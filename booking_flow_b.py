@@ -23,6 +23,7 @@ except ImportError:
     HAS_TKCALENDAR = False
     print("tkcalendar not found - Using text entry instead")
 
+from booking_storage import create_idempotency_key
 from rooms_data import filter_rooms
 
 def create_round_rect_canvas(canvas, x1, y1, x2, y2, radius=20, tags=None, **kwargs):
@@ -238,6 +239,11 @@ class DateSelectionPage(tk.Frame):
             "nights": nights,
         }
 
+        # A new booking session starts here. The confirmation page saves the
+        # booking with this key, so showing that page again cannot save a
+        # second copy of the same booking.
+        self.controller.booking_session_key = create_idempotency_key()
+
         messagebox.showinfo(
             "Success",
             f"You are staying for {nights} night(s). Now I will take you to the filter page.",
@@ -489,7 +489,10 @@ class ConfirmationPage(tk.Frame):
 
         # Generate confirmation code and save to JSON
         try:
-            confirmation_code = add_booking(booking_data)
+            confirmation_code = add_booking(
+                booking_data,
+                idempotency_key=getattr(self.controller, "booking_session_key", None),
+            )
             self.code_label.config(text=confirmation_code)
 
             # Save to controller for potential later use
@@ -522,6 +525,8 @@ class ConfirmationPage(tk.Frame):
             delattr(self.controller, "current_filter")
         if hasattr(self.controller, "total_price"):
             delattr(self.controller, "total_price")
+        if hasattr(self.controller, "booking_session_key"):
+            delattr(self.controller, "booking_session_key")
 
         # Return to welcome page
         self.controller.show_frame("WelcomePage")
\ No newline at end of file
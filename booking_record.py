@@ -0,0 +1,191 @@
+# booking_record.py
+# This is the compact in-memory form of one booking. booking_storage keeps
+# its cached list as Booking objects instead of plain dicts, because with
+# hundreds of thousands of bookings the dicts were the biggest memory cost.
+#
+# What makes a Booking smaller than the dict it came from:
+# - __slots__ instead of a per-record dict (no repeated key table).
+# - Values that repeat a lot (status, room type, room number, room name)
+#   are interned, so every record points at one shared string.
+# - Dates are kept as day ordinals (also interned, there are only a few
+#   hundred different days) instead of 'YYYY-MM-DD' strings.
+#
+# A Booking still behaves like a dict (it is a MutableMapping: get, [],
+# del, len, iteration, pop, update, setdefault, ...), and
+# to_dict()/from_dict() convert to and from the JSON form at the edges.
+
+from collections.abc import MutableMapping
+from datetime import date
+from functools import lru_cache
+
+# The fields a booking made by the app has, in the order the confirmation
+# page writes them. to_dict() keeps this order, so bookings.json looks the
+# same as before.
+FIELDS = (
+    "first_name", "last_name", "email", "phone", "adults", "children",
+    "room_type", "room_name", "room_number", "check_in", "check_out",
+    "nights", "breakfast", "shuttle", "total_price", "payment_last4",
+    "status", "confirmation_code", "created_at", "idempotency_key",
+)
+DATE_FIELDS = frozenset(("check_in", "check_out", "created_at"))
+INTERNED_FIELDS = frozenset(("room_type", "room_name", "room_number", "status"))
+
+_FIELD_SET = frozenset(FIELDS)
+_MISSING = object()
+
+# One shared object per distinct value of the interned fields and dates.
+_interned = {}
+
+
+def intern_value(value):
+    """I return the shared copy of value (value itself if it is new)."""
+    try:
+        return _interned.setdefault(value, value)
+    except TypeError:
+        # Lists and dicts cannot be shared like this.
+        return value
+
+
+@lru_cache(maxsize=4096)
+def _canonical_ordinal(value):
+    """I return the day ordinal of an exact 'YYYY-MM-DD' string, else None."""
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return None
+    if day.isoformat() != value:
+        # fromisoformat also accepts forms like 20250101, which I could
+        # not write back unchanged, so I keep those as they are.
+        return None
+    return intern_value(day.toordinal())
+
+
+class Booking(MutableMapping):
+    """
+    I hold one booking. Known fields live in slots, anything else (for
+    example fields added by a newer version of the app) goes to extra.
+    A slot that was never set means the key is missing, like in a dict.
+    """
+
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self):
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """I build a Booking from a JSON dict."""
+        booking = cls()
+        for key, value in data.items():
+            booking[key] = value
+        return booking
+
+    def to_dict(self):
+        """I return the booking as a plain JSON dict."""
+        data = {}
+        for key in FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                continue
+            if key in DATE_FIELDS:
+                value = date.fromordinal(value).isoformat()
+            data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def ordinal(self, key):
+        """
+        I return a date field as a day ordinal without any parsing,
+        or None when it is missing or not a valid date.
+        """
+        return getattr(self, key, None)
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                if key in DATE_FIELDS:
+                    return date.fromordinal(value).isoformat()
+                return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in DATE_FIELDS and isinstance(value, str):
+            ordinal = _canonical_ordinal(value)
+            if ordinal is not None:
+                setattr(self, key, ordinal)
+                self._drop_extra(key)
+                return
+        elif key in _FIELD_SET and key not in DATE_FIELDS:
+            if key in INTERNED_FIELDS:
+                value = intern_value(value)
+            setattr(self, key, value)
+            self._drop_extra(key)
+            return
+
+        # Unknown keys and odd date values are kept exactly as they came.
+        if key in _FIELD_SET and hasattr(self, key):
+            delattr(self, key)
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET and hasattr(self, key):
+            delattr(self, key)
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        # Same order as to_dict(), without converting any values.
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self.extra:
+            yield from list(self.extra)
+
+    def __len__(self):
+        count = sum(1 for key in FIELDS if hasattr(self, key))
+        return count + len(self.extra or ())
+
+    def _drop_extra(self, key):
+        if self.extra and key in self.extra:
+            del self.extra[key]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self[key] = default
+            return default
+        return value
+
+    def update(self, other=(), **kwargs):
+        for key, value in dict(other, **kwargs).items():
+            self[key] = value
+
+    def copy(self):
+        """I return a plain dict copy, like dict.copy() would."""
+        return self.to_dict()
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __repr__(self):
+        return f"Booking({self.to_dict()!r})"
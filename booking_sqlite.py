@@ -0,0 +1,323 @@
+# booking_sqlite.py
+# This is the SQLite version of my booking storage. booking_storage.py
+# switches to it with set_backend("sqlite"), so the pages keep calling the
+# same functions (add_booking, find_booking_by_code, ...) as before.
+#
+# Every booking is stored as its full JSON dict in the "data" column.
+# Next to it I keep a few copied columns only so SQLite can index them:
+#   last_name          -> lower case, like the login compares it
+#   confirmation_code  -> upper case
+#   room_number, room_type, status
+#   check_in, check_out -> 'YYYY-MM-DD' (NULL when the date is broken)
+#   idempotency_key    -> unique, NULL for bookings made without one
+#
+# Running this file directly copies bookings.json (journal and archive
+# included) into the SQLite file:
+#     python booking_sqlite.py
+
+import json
+import sqlite3
+from datetime import datetime
+
+TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    last_name TEXT NOT NULL,
+    confirmation_code TEXT NOT NULL,
+    room_number TEXT,
+    room_type TEXT,
+    status TEXT,
+    check_in TEXT,
+    check_out TEXT,
+    idempotency_key TEXT,
+    data TEXT NOT NULL
+);
+"""
+
+# Columns added after the first version of the table. Older database
+# files get them with ALTER TABLE when they are opened.
+ADDED_COLUMNS = (
+    ("idempotency_key", "TEXT"),
+)
+
+INDEX_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_bookings_code
+    ON bookings (confirmation_code);
+CREATE INDEX IF NOT EXISTS idx_bookings_name_code
+    ON bookings (last_name, confirmation_code);
+CREATE INDEX IF NOT EXISTS idx_bookings_room_dates
+    ON bookings (room_number, check_in, check_out);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency
+    ON bookings (idempotency_key);
+"""
+
+
+def _iso_date(value):
+    """I normalise a 'YYYY-MM-DD' string, or return None if it is invalid."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_values(booking):
+    """I return the indexed column values for one booking dict."""
+    r_num = booking.get("room_number")
+    return (
+        str(booking.get("last_name", "")).lower(),
+        str(booking.get("confirmation_code", "")).upper(),
+        str(r_num) if r_num else None,
+        str(booking.get("room_type", "")),
+        booking.get("status"),
+        _iso_date(booking.get("check_in", "")),
+        _iso_date(booking.get("check_out", "")),
+        booking.get("idempotency_key") or None,
+        json.dumps(booking),
+    )
+
+
+class SqliteBookingRepository:
+    """
+    I store bookings in one SQLite table (WAL mode) and answer the same
+    questions booking_storage answers for the JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Size of the booking data I wrote into rows, for write_stats().
+        self.bytes_written = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(TABLE_SCHEMA)
+        self._add_missing_columns()
+        self.conn.executescript(INDEX_SCHEMA)
+
+    def _add_missing_columns(self):
+        """I upgrade a database file made by an older version of this module."""
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(bookings)")}
+        for name, column_type in ADDED_COLUMNS:
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE bookings ADD COLUMN {name} {column_type}")
+
+    def close(self):
+        self.conn.close()
+
+    def load_all(self):
+        """I return every booking as a list of dicts (in insert order)."""
+        rows = self.conn.execute("SELECT data FROM bookings ORDER BY id")
+        return [json.loads(data) for (data,) in rows]
+
+    def iter_all(self):
+        """I yield the bookings one by one straight from the cursor."""
+        for (data,) in self.conn.execute("SELECT data FROM bookings ORDER BY id"):
+            yield json.loads(data)
+
+    def replace_all(self, bookings):
+        """I replace the whole table with the given list in one transaction."""
+        with self.conn:
+            self.conn.execute("DELETE FROM bookings")
+            self.conn.executemany(
+                "INSERT INTO bookings (last_name, confirmation_code, "
+                "room_number, room_type, status, check_in, check_out, "
+                "idempotency_key, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._row(b) for b in bookings if isinstance(b, dict)),
+            )
+
+    def add(self, booking, prepare=None):
+        """
+        I insert one booking and return its confirmation code.
+
+        prepare is called after SQLite gave me the write lock, so it can
+        safely pick a confirmation code that nobody else uses yet.
+
+        If another booking already has the same idempotency_key (for
+        example saved by a second app window just now) I keep that one
+        and return its code instead.
+        """
+        try:
+            with self.conn:
+                if prepare is not None:
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    prepare()
+                self.conn.execute(
+                    "INSERT INTO bookings (last_name, confirmation_code, "
+                    "room_number, room_type, status, check_in, check_out, "
+                    "idempotency_key, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._row(booking),
+                )
+        except sqlite3.IntegrityError:
+            existing = self.find_by_idempotency_key(booking.get("idempotency_key"))
+            if existing is None:
+                raise
+            booking["confirmation_code"] = existing["confirmation_code"]
+        return booking["confirmation_code"]
+
+    def add_many(self, bookings, prepare=None):
+        """
+        I insert a group of bookings in one transaction.
+
+        prepare is called after SQLite gave me the write lock. When it
+        returns False I insert nothing. I return True when I inserted.
+        """
+        with self.conn:
+            if prepare is not None:
+                self.conn.execute("BEGIN IMMEDIATE")
+                if not prepare():
+                    return False
+            self.conn.executemany(
+                "INSERT INTO bookings (last_name, confirmation_code, "
+                "room_number, room_type, status, check_in, check_out, "
+                "idempotency_key, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._row(b) for b in bookings),
+            )
+        return True
+
+    def room_is_booked(self, room_number, check_in, check_out):
+        """I check if a non-cancelled stay in this room overlaps the dates."""
+        row = self.conn.execute(
+            "SELECT 1 FROM bookings "
+            "WHERE room_number = ? AND check_in < ? AND check_out > ? "
+            "AND status IS NOT 'Cancelled' LIMIT 1",
+            (str(room_number), check_out, check_in),
+        ).fetchone()
+        return row is not None
+
+    def find_by_idempotency_key(self, idempotency_key):
+        """I return the booking saved with this idempotency key, or None."""
+        if not idempotency_key:
+            return None
+        row = self.conn.execute(
+            "SELECT data FROM bookings WHERE idempotency_key = ?",
+            (idempotency_key,),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def data_version(self):
+        """
+        I return SQLite's data_version for my connection. It changes when
+        another connection (another app window) commits to the file, and
+        stays the same for my own commits.
+        """
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def code_exists(self, code):
+        """I check if any booking already uses this confirmation code."""
+        row = self.conn.execute(
+            "SELECT 1 FROM bookings WHERE confirmation_code = ? LIMIT 1",
+            (str(code).upper(),),
+        ).fetchone()
+        return row is not None
+
+    def last_sequence_number(self, parse_code):
+        """
+        I return the highest running number of the "sequence" style codes.
+
+        Those codes have a fixed width and their alphabet is in ASCII
+        order, so I walk the code index from the top and stop at the
+        first code parse_code accepts.
+        """
+        rows = self.conn.execute(
+            "SELECT confirmation_code FROM bookings "
+            "WHERE confirmation_code >= 'S' AND confirmation_code < 'T' "
+            "ORDER BY confirmation_code DESC"
+        )
+        for (code,) in rows:
+            number = parse_code(code)
+            if number is not None:
+                return number
+        return 0
+
+    def _find_rows(self, last_name, code):
+        return self.conn.execute(
+            "SELECT id, data FROM bookings "
+            "WHERE last_name = ? AND confirmation_code = ? ORDER BY id",
+            (str(last_name).lower(), str(code).upper()),
+        ).fetchall()
+
+    def find(self, last_name, code):
+        """I return the first booking matching last name and code, or None."""
+        rows = self._find_rows(last_name, code)
+        if not rows:
+            return None
+        return json.loads(rows[0][1])
+
+    def _row(self, booking):
+        """I return _row_values(booking) and count the bytes of its data."""
+        values = _row_values(booking)
+        self.bytes_written += len(values[-1])
+        return values
+
+    def _update_row(self, row_id, booking):
+        self.conn.execute(
+            "UPDATE bookings SET last_name = ?, confirmation_code = ?, "
+            "room_number = ?, room_type = ?, status = ?, check_in = ?, "
+            "check_out = ?, idempotency_key = ?, data = ? WHERE id = ?",
+            self._row(booking) + (row_id,),
+        )
+
+    def update(self, last_name, code, new_fields):
+        """I copy new_fields into every matching booking and return True/False."""
+        return self.update_many([((last_name, code), new_fields)])[0]
+
+    def update_many(self, changes):
+        """
+        I apply a list of ((last_name, code), new_fields) in one transaction
+        and return True/False for every change.
+        """
+        results = []
+        with self.conn:
+            # I take the write lock before reading, so no other app window
+            # can change these rows between my read and my write.
+            self.conn.execute("BEGIN IMMEDIATE")
+            for (last_name, code), new_fields in changes:
+                rows = self._find_rows(last_name, code)
+                for row_id, data in rows:
+                    booking = json.loads(data)
+                    booking.update(new_fields)
+                    self._update_row(row_id, booking)
+                results.append(bool(rows))
+        return results
+
+    def update_where(self, predicate, new_fields):
+        """I update every booking for which predicate(booking) is True."""
+        count = 0
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute("SELECT id, data FROM bookings").fetchall()
+            for row_id, data in rows:
+                booking = json.loads(data)
+                if predicate(booking):
+                    booking.update(new_fields)
+                    self._update_row(row_id, booking)
+                    count += 1
+        return count
+
+    def count_confirmed_by_room_type(self, room_type):
+        """I count confirmed bookings (no status means confirmed) of a type."""
+        (count,) = self.conn.execute(
+            "SELECT COUNT(*) FROM bookings "
+            "WHERE room_type = ? AND COALESCE(status, 'Confirmed') = 'Confirmed'",
+            (room_type,),
+        ).fetchone()
+        return count
+
+    def unavailable_room_numbers(self, check_in, check_out):
+        """I return the room numbers with a non-cancelled stay overlapping the dates."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT room_number FROM bookings "
+            "WHERE room_number IS NOT NULL "
+            "AND check_in < ? AND check_out > ? "
+            "AND status IS NOT 'Cancelled'",
+            (check_out, check_in),
+        )
+        return {room_number for (room_number,) in rows}
+
+
+if __name__ == "__main__":
+    import booking_storage
+
+    count = booking_storage.migrate_to_sqlite()
+    print(f"Copied {count} booking(s) into {booking_storage.SQLITE_FILE}")
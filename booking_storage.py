@@ -1,38 +1,1774 @@
 # booking_storage.py
 # This is my small helper module for saving and loading bookings.
 # I am using a plain JSON file because it matches what we did in class.
+#
+# There are three ways of writing:
+# - "journal" (default): every change is appended as one JSON line to
+#   bookings.journal and a background compaction folds the journal back
+#   into bookings.json from time to time. Reading always means
+#   bookings.json plus whatever is still in the journal. So changing an
+#   email writes one small line, not the whole file.
+# - "json": every change rewrites the whole bookings.json (the old way).
+# - "sqlite": everything goes through SqliteBookingRepository in
+#   booking_sqlite.py (bookings.sqlite3, WAL mode, indexed lookups).
+#
+# Several app windows (also in different processes) can share one data
+# folder. Every read-modify-write of the JSON files happens while holding
+# an exclusive lock on bookings.json.lock, and reading the files from disk
+# needs a shared lock, so nobody loses a booking saved by somebody else.
+#
+# bookings.json only has to hold the stays that can still block a room.
+# archive_bookings() moves cancelled stays and stays that are over into
+# monthly shards archive/bookings-YYYY-MM.json (by check-in month), which
+# only reports, the login fallback and searches of past dates read. A stay
+# that runs into the next month goes to the "long" spill shard instead, so
+# a date range only has to open the shards of its own months plus that one.
 
+import atexit
+import glob
 import json
 import os
+import queue
+import shutil
+import threading
+import time
+import traceback
 import uuid
-from datetime import date, datetime
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
+
+from booking_columns import BookingColumns
+from booking_record import Booking
+from booking_sqlite import SqliteBookingRepository
+
+# fcntl only exists on Linux/macOS. Without it I can still lock between
+# threads, but not between processes.
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(BASE_DIR, "bookings.json")
 
+SQLITE_FILE = os.path.join(BASE_DIR, "bookings.sqlite3")
+
+STORAGE_BACKENDS = ("json", "journal", "sqlite")
+STORAGE_BACKEND = "journal"
+
+# The open SQLite repository while the "sqlite" backend is active.
+_repository = None
+
+# How many older copies of bookings.json I keep next to it
+# (bookings.json.bak.1 is the newest one). 0 switches the backups off.
+BACKUP_COUNT = 1
+
+# How new confirmation codes look:
+# - "random": 8 hex characters from a uuid4, e.g. 9910A7CB (the old style).
+# - "sequence": "S" + 6 base-32 digits of a running number + 1 check
+#   character, e.g. S000001Y. The next number is known without a scan
+#   and the check character catches most typos.
+CODE_SCHEME = "random"
+CODE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+SEQUENCE_PREFIX = "S"
+SEQUENCE_DIGITS = 6
+
+# When this is True, read-only questions asked while the cache is not
+# loaded (find_booking_by_code, get_unavailable_room_numbers) stream the
+# file with iter_bookings() instead of loading everything. That keeps a
+# report script in little memory, but the app is faster with the cache.
+STREAM_COLD_READS = False
+
+# The availability search uses one bitmap per room with a bit per night,
+# from the day the bitmaps were built until OCCUPANCY_DAYS later. When
+# they are older than OCCUPANCY_REBUILD_DAYS I build them again from today.
+OCCUPANCY_DAYS = 730
+OCCUPANCY_REBUILD_DAYS = 30
+
+# When the journal grows over this size I start a background compaction.
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# Where archive_bookings() puts past and cancelled stays, and how often
+# (in seconds) the thread from start_archiving() runs it.
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+ARCHIVE_INTERVAL_SECONDS = 24 * 60 * 60
+LONG_STAYS_PARTITION = "long"
+
+# Everything that touches the files or the cache happens under this lock,
+# because the compaction runs in its own thread.
+_lock = threading.RLock()
+_compaction = {
+    "thread": None,
+}
+
+# What I know about the archive, read from archive/index.json again only
+# when that file changes:
+#   index: code.upper() -> list of partitions ("YYYY-MM") holding it, so
+#          a login finds its archive file without opening the others and
+#          archived codes are never given out again
+#   last_sequence: highest running number of an archived "sequence" code
+_archive = {
+    "path": None,
+    "signature": None,
+    "index": {},
+    "last_sequence": 0,
+    "thread": None,
+}
+
+# The file lock this process holds right now. Nested calls (add_booking
+# calls load_bookings) reuse it, so the outermost call decides if it is
+# shared or exclusive. That is why writers lock before they read.
+_file_lock_state = {
+    "fd": None,
+    "depth": 0,
+}
+
+# Upper limits (in milliseconds) of the lock-wait histogram buckets.
+# The last bucket counts every wait that took longer than that.
+LOCK_WAIT_BUCKETS_MS = (0.1, 1, 10, 100, 1000)
+_lock_waits = {
+    "shared": [0] * (len(LOCK_WAIT_BUCKETS_MS) + 1),
+    "exclusive": [0] * (len(LOCK_WAIT_BUCKETS_MS) + 1),
+}
+
+# Bytes written per public write operation (see write_stats()):
+#   operation -> {"calls", "bytes", "last_bytes"}
+# Each thread counts its own bytes, so a background compaction never
+# ends up in the numbers of the update running next to it.
+_write_stats = {}
+_thread_writes = threading.local()
+
+# The change feed (see subscribe()):
+#   version: goes up by one for every change that was saved
+#   subscribers: list of (callback, events) pairs
+_feed = {
+    "version": 0,
+    "subscribers": [],
+    # PRAGMA data_version of the SQLite file when I last looked.
+    "data_version": None,
+}
+CHANGE_EVENTS = ("add", "update", "cancel", "reload")
+# How often (in milliseconds) a Tk subscriber's queue is emptied.
+FEED_POLL_MS = 100
+
+
+# I keep the parsed bookings in memory so I do not have to read and parse
+# the whole JSON file again for every search or login. The cached list
+# holds compact Booking records (booking_record.py), not plain dicts. The file is only
+# read again when its signature (mtime, size, inode) changes, for example
+# when somebody edits bookings.json by hand or another app instance saves.
+#
+# Next to the list I keep a lookup index so a login does not have to scan
+# every booking:
+#   by_code: (last_name.lower(), code.upper()) -> list of list positions
+# and an availability index so a search does not have to parse the dates
+# of every booking again:
+#   by_room: room_number -> sorted list of (check_in, check_out, position)
+#            with the dates stored as day ordinals (cancelled stays left out)
+#   longest_stay: room_number -> longest stay (in days) ever indexed there
+# and one more so a repeated add_booking for the same booking attempt is
+# a simple lookup:
+#   by_idempotency: idempotency_key -> list position
+# and the set of confirmation codes already given out, so a new code can
+# be checked for collisions in O(1):
+#   codes: set of upper case codes (they stay reserved, even when the
+#          booking behind them changes)
+#   last_sequence: highest running number of a "sequence" style code
+# and, once a report asked for it, the column view (booking_columns.py):
+#   columns: BookingColumns with the archived bookings first and then one
+#            row per list position, or None
+#   columns_offset: row of list position 0 (how many archived rows)
+#   columns_archive: signature of archive/index.json the rows were read at
+# and, once a search asked for it, the per-night occupancy bitmaps:
+#   occupancy: room_number -> int, bit d set when night
+#              occupancy_start + d is taken by a non-cancelled stay
+#              (None until the first search)
+#   occupancy_start: day ordinal of bit 0
+#   occupancy_odd: room_number -> how many of its stays end on or before
+#                  their check-in (they have no nights, but the old
+#                  overlap rule can still match them, so those rooms
+#                  are checked with by_room instead)
+_cache = {
+    "path": None,
+    "signature": None,
+    "bookings": None,
+    "by_code": {},
+    "by_room": {},
+    "longest_stay": {},
+    "by_idempotency": {},
+    "codes": set(),
+    "last_sequence": 0,
+    "columns": None,
+    "columns_offset": 0,
+    "columns_archive": None,
+    "occupancy": None,
+    "occupancy_start": 0,
+    "occupancy_odd": {},
+}
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def _file_signature(path):
+    """I return (mtime_ns, size, inode) for a file or None when it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _record_lock_wait(kind, waited_ms):
+    """I put one lock wait into its histogram bucket."""
+    bucket = len(LOCK_WAIT_BUCKETS_MS)
+    for i, limit in enumerate(LOCK_WAIT_BUCKETS_MS):
+        if waited_ms < limit:
+            bucket = i
+            break
+    _lock_waits[kind][bucket] += 1
+
+
+def lock_wait_histogram():
+    """
+    I return how long we had to wait for the bookings file lock, as
+    {"shared": {...}, "exclusive": {...}} with bucket labels like "<1ms".
+    """
+    labels = [f"<{limit}ms" for limit in LOCK_WAIT_BUCKETS_MS]
+    labels.append(f">={LOCK_WAIT_BUCKETS_MS[-1]}ms")
+    return {kind: dict(zip(labels, counts)) for kind, counts in _lock_waits.items()}
+
+
+def _count_bytes(count):
+    """I add bytes this thread just wrote to the operation it is running."""
+    if getattr(_thread_writes, "depth", 0):
+        _thread_writes.bytes += count
+
+
+def _write_operation(operation):
+    """
+    I am the decorator of every public write function. I add the bytes
+    written by one call to the write stats of operation and, once the
+    call succeeded, send its changes to the subscribers (see subscribe()).
+    When write functions call each other (update_booking ->
+    update_bookings -> save_bookings) only the outermost one counts.
+    """
+    def decorate(func):
+        @wraps(func)
+        def counted(*args, **kwargs):
+            depth = getattr(_thread_writes, "depth", 0)
+            if depth:
+                _thread_writes.depth += 1
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    _thread_writes.depth -= 1
+
+            repository = _repository
+            repository_before = repository.bytes_written if repository else 0
+            _thread_writes.bytes = 0
+            _thread_writes.changes = []
+            _thread_writes.depth = 1
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                if _thread_writes.changes:
+                    # Part of it may have reached the cache or the disk.
+                    _thread_writes.changes = [("reload", None)]
+                raise
+            finally:
+                _thread_writes.depth = 0
+                written = _thread_writes.bytes
+                if repository is not None:
+                    written += repository.bytes_written - repository_before
+                with _lock:
+                    stats = _write_stats.setdefault(
+                        operation, {"calls": 0, "bytes": 0, "last_bytes": 0})
+                    stats["calls"] += 1
+                    stats["bytes"] += written
+                    stats["last_bytes"] = written
+                changes = _thread_writes.changes
+                _thread_writes.changes = []
+                _publish(changes)
+            return result
+        return counted
+    return decorate
+
+
+def write_stats():
+    """
+    I return how many bytes each write operation put on disk, as
+    {"update_booking": {"calls": 3, "bytes": 900, "last_bytes": 300,
+    "bytes_per_call": 300.0}, ...}. For SQLite I count the row data.
+    """
+    with _lock:
+        return {operation: dict(stats, bytes_per_call=stats["bytes"] / stats["calls"])
+                for operation, stats in _write_stats.items()}
+
+
+def _acquire_file_lock(exclusive):
+    """I open bookings.json.lock and block until I get the flock on it."""
+    kind = "exclusive" if exclusive else "shared"
+    started = time.perf_counter()
+    if HAS_FCNTL:
+        fd = os.open(DB_FILE + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            os.close(fd)
+            raise
+        _file_lock_state["fd"] = fd
+    _record_lock_wait(kind, (time.perf_counter() - started) * 1000)
+
+
+def _release_file_lock():
+    fd = _file_lock_state["fd"]
+    _file_lock_state["fd"] = None
+    if fd is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+@contextmanager
+def _file_lock(exclusive):
+    """
+    I hold the thread lock plus a shared or exclusive lock on
+    bookings.json.lock for the duration of a with block.
+
+    I lock a separate file because bookings.json itself is replaced by
+    a rename on every save, so a lock on it would not last.
+    """
+    with _lock:
+        if _file_lock_state["depth"] == 0:
+            _acquire_file_lock(exclusive)
+        _file_lock_state["depth"] += 1
+        try:
+            yield
+        finally:
+            _file_lock_state["depth"] -= 1
+            if _file_lock_state["depth"] == 0:
+                _release_file_lock()
+
+
+def _journal_paths():
+    """
+    I return (compacting_path, journal_path) for the current DB_FILE.
+
+    While a compaction runs, the journal it is folding in is renamed to
+    the compacting path so new changes can go to a fresh journal.
+    """
+    base = os.path.splitext(DB_FILE)[0]
+    return base + ".journal.compacting", base + ".journal"
+
+
+def _current_signature():
+    """I return the signatures of the snapshot and both journal files."""
+    compacting_path, journal_path = _journal_paths()
+    return (_file_signature(DB_FILE),
+            _file_signature(compacting_path),
+            _file_signature(journal_path))
+
+
+def _cache_in_sync():
+    """I check if the cached list still matches the files on disk."""
+    return (_cache["bookings"] is not None
+            and _cache["path"] == DB_FILE
+            and _cache["signature"] == _current_signature())
+
+
+def _booking_key(last_name, code):
+    """I normalise last name and code the same way the login compares them."""
+    return (str(last_name).lower(), str(code).upper())
 
-def load_bookings():
-    """I load all bookings from the JSON file and always return a list."""
-    if not os.path.exists(DB_FILE):
-        return []
 
+def _date_ordinal(value):
+    """I turn a 'YYYY-MM-DD' string into a day number, or None if it is invalid."""
     try:
-        with open(DB_FILE, "r", encoding="utf-8") as f:
+        return _parse_ordinal(value)
+    except TypeError:
+        # lru_cache cannot hash lists or dicts, and they are no dates anyway.
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_ordinal(value):
+    """
+    I do the real parsing for _date_ordinal. There are only a few hundred
+    different days in the bookings, so the cache means every date string
+    is parsed once, not once per booking and search.
+    """
+    try:
+        day = date.fromisoformat(value)
+        if day.isoformat() == value:
+            return day.toordinal()
+    except (TypeError, ValueError):
+        pass
+    # strptime is slow, but it also accepts forms like 2025-1-5 that the
+    # old code accepted, so I keep it for everything that is not canonical.
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _booking_ordinal(booking, field):
+    """
+    I return a date field of a booking as a day number, or None.
+    A record already keeps normal 'YYYY-MM-DD' dates as day numbers, so
+    only odd ones (like 2025-1-5) are parsed here.
+    """
+    if isinstance(booking, Booking):
+        ordinal = booking.ordinal(field)
+        if ordinal is not None:
+            return ordinal
+    return _date_ordinal(booking.get(field, ""))
+
+
+def _room_span(position, booking):
+    """
+    I return (room_number, (check_in, check_out, position)) for a booking
+    that blocks a room, or None when it does not block anything
+    (cancelled, no room number or broken dates).
+    """
+    if booking.get("status") == "Cancelled":
+        return None
+
+    r_num = booking.get("room_number")
+    if not r_num:
+        return None
+
+    b_in = _booking_ordinal(booking, "check_in")
+    b_out = _booking_ordinal(booking, "check_out")
+    if b_in is None or b_out is None:
+        return None
+
+    return str(r_num), (b_in, b_out, position)
+
+
+def _index_booking(position, booking):
+    """I add one booking (at its list position) to the lookup indexes."""
+    key = _booking_key(booking.get("last_name", ""),
+                       booking.get("confirmation_code", ""))
+    _cache["by_code"].setdefault(key, []).append(position)
+
+    code = key[1]
+    _cache["codes"].add(code)
+    sequence = _sequence_number(code)
+    if sequence is not None and sequence > _cache["last_sequence"]:
+        _cache["last_sequence"] = sequence
+
+    idempotency_key = booking.get("idempotency_key")
+    if idempotency_key:
+        _cache["by_idempotency"].setdefault(idempotency_key, position)
+
+    room_span = _room_span(position, booking)
+    if room_span is not None:
+        room_number, span = room_span
+        insort(_cache["by_room"].setdefault(room_number, []), span)
+        longest = _cache["longest_stay"].get(room_number, 0)
+        _cache["longest_stay"][room_number] = max(longest, span[1] - span[0])
+        if _cache["occupancy"] is not None:
+            _mark_stay(room_number, span[0], span[1])
+
+    # An update unindexes and indexes the same position again, so this
+    # always leaves the row of this position up to date.
+    if _cache["columns"] is not None:
+        _cache["columns"].put(_cache["columns_offset"] + position, booking,
+                              _booking_ordinal(booking, "check_in"),
+                              _booking_ordinal(booking, "check_out"))
+
+
+def _unindex_booking(position, booking):
+    """I remove one booking (at its list position) from the lookup indexes."""
+    key = _booking_key(booking.get("last_name", ""),
+                       booking.get("confirmation_code", ""))
+    positions = _cache["by_code"].get(key, [])
+    if position in positions:
+        positions.remove(position)
+    if not positions:
+        _cache["by_code"].pop(key, None)
+
+    idempotency_key = booking.get("idempotency_key")
+    if _cache["by_idempotency"].get(idempotency_key) == position:
+        del _cache["by_idempotency"][idempotency_key]
+
+    room_span = _room_span(position, booking)
+    if room_span is not None:
+        room_number, span = room_span
+        spans = _cache["by_room"].get(room_number, [])
+        i = bisect_left(spans, span)
+        if i < len(spans) and spans[i] == span:
+            del spans[i]
+            if _cache["occupancy"] is not None:
+                _unmark_stay(room_number, span[0], span[1])
+        # I keep longest_stay as it is. It is only an upper bound
+        # for the search window, so a value that is too big is still correct.
+
+
+def _span_start(span):
+    """I return the check-in ordinal of an index entry (used as bisect key)."""
+    return span[0]
+
+
+def _room_is_blocked(room_number, req_in, req_out):
+    """
+    I check if any indexed stay in this room overlaps [req_in, req_out).
+
+    A stay can only overlap when it starts before req_out and, because no
+    stay in this room is longer than longest_stay, after
+    req_in - longest_stay. So I only look at that small slice of the list.
+    """
+    spans = _cache["by_room"].get(room_number, [])
+    longest = _cache["longest_stay"].get(room_number, 0)
+    lo = bisect_right(spans, req_in - longest, key=_span_start)
+    hi = bisect_left(spans, req_out, key=_span_start)
+    for b_in, b_out, _position in spans[lo:hi]:
+        # Overlap Logic: (StartA < EndB) and (EndA > StartB)
+        if req_in < b_out and req_out > b_in:
+            return True
+    return False
+
+
+def _stay_bits(b_in, b_out):
+    """I return the bitmap of the nights [b_in, b_out) inside the horizon."""
+    start = _cache["occupancy_start"]
+    low = max(b_in, start) - start
+    high = min(b_out, start + OCCUPANCY_DAYS) - start
+    if high <= low:
+        return 0
+    return ((1 << (high - low)) - 1) << low
+
+
+def _mark_stay(room_number, b_in, b_out):
+    """I set the nights of one stay in the bitmap of its room."""
+    if b_out <= b_in:
+        odd = _cache["occupancy_odd"]
+        odd[room_number] = odd.get(room_number, 0) + 1
+        return
+    occupancy = _cache["occupancy"]
+    occupancy[room_number] = occupancy.get(room_number, 0) | _stay_bits(b_in, b_out)
+
+
+def _unmark_stay(room_number, b_in, b_out):
+    """
+    I clear the nights of a stay that was just taken out of by_room.
+    Old data can have overlapping stays in one room, so I set the nights
+    that another stay still uses again.
+    """
+    if b_out <= b_in:
+        odd = _cache["occupancy_odd"]
+        odd[room_number] -= 1
+        if not odd[room_number]:
+            del odd[room_number]
+        return
+
+    bits = _stay_bits(b_in, b_out)
+    if not bits:
+        return
+    occupied = _cache["occupancy"].get(room_number, 0) & ~bits
+
+    spans = _cache["by_room"].get(room_number, [])
+    longest = _cache["longest_stay"].get(room_number, 0)
+    lo = bisect_right(spans, b_in - longest, key=_span_start)
+    hi = bisect_left(spans, b_out, key=_span_start)
+    for s_in, s_out, _position in spans[lo:hi]:
+        if s_in < s_out:
+            occupied |= _stay_bits(s_in, s_out) & bits
+    _cache["occupancy"][room_number] = occupied
+
+
+def _occupancy_ready():
+    """I build the occupancy bitmaps when they are missing or too old."""
+    today = date.today().toordinal()
+    if (_cache["occupancy"] is not None
+            and today - _cache["occupancy_start"] <= OCCUPANCY_REBUILD_DAYS):
+        return
+    _cache["occupancy"] = {}
+    _cache["occupancy_odd"] = {}
+    _cache["occupancy_start"] = today
+    for room_number, spans in _cache["by_room"].items():
+        for b_in, b_out, _position in spans:
+            _mark_stay(room_number, b_in, b_out)
+
+
+def _build_indexes(bookings):
+    """I build the lookup indexes from scratch for a freshly loaded list."""
+    _cache["by_code"] = {}
+    _cache["by_room"] = {}
+    _cache["longest_stay"] = {}
+    _cache["by_idempotency"] = {}
+    _cache["codes"] = set()
+    _cache["last_sequence"] = 0
+    _cache["columns"] = None
+    _cache["occupancy"] = None
+    _cache["occupancy_odd"] = {}
+    for position, booking in enumerate(bookings):
+        if isinstance(booking, Booking):
+            _index_booking(position, booking)
+
+
+def _as_record(booking):
+    """I turn a booking dict into a Booking record (anything else stays as it is)."""
+    if isinstance(booking, dict):
+        return Booking.from_dict(booking)
+    return booking
+
+
+def _to_records(bookings):
+    """
+    I replace the dicts in a freshly read list by Booking records, one by
+    one, so the dict of each booking can be freed right after it is copied.
+    """
+    for position, booking in enumerate(bookings):
+        bookings[position] = _as_record(booking)
+    return bookings
+
+
+def _json_default(value):
+    """I let json.dump write Booking records like the dicts they came from."""
+    if isinstance(value, Booking):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _build_columns(bookings, columns=None):
+    """
+    I build the column view for a list (or stream) of bookings, or add
+    their rows after the ones columns already has.
+    """
+    if columns is None:
+        columns = BookingColumns()
+    for position, booking in enumerate(bookings, len(columns)):
+        if isinstance(booking, (Booking, dict)):
+            columns.put(position, booking,
+                        _booking_ordinal(booking, "check_in"),
+                        _booking_ordinal(booking, "check_out"))
+        else:
+            columns.put(position, None, None, None)
+    return columns
+
+
+def _find_positions(last_name, code):
+    """I return (bookings, positions) of the records matching name and code."""
+    bookings = load_bookings()
+    positions = _cache["by_code"].get(_booking_key(last_name, code), [])
+    return bookings, list(positions)
+
+
+def _apply_update(bookings, positions, new_fields):
+    """I copy new_fields into the bookings at the given positions."""
+    for position in positions:
+        booking = bookings[position]
+        # If the name or code itself changes the index key moves too.
+        _unindex_booking(position, booking)
+        for key, value in new_fields.items():
+            booking[key] = value
+        _index_booking(position, booking)
+        _record_change(_update_event(new_fields), booking.to_dict())
+
+
+def _read_json_list(path):
+    """I parse one JSON file and return its list, or None if I cannot."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
     except (json.JSONDecodeError, OSError):
-        # If something is wrong with the file I prefer to start with an empty list.
-        return []
+        return None
 
     if isinstance(data, list):
         return data
-    else:
+    return None
+
+
+def _read_snapshot():
+    """I read and parse the JSON file and always return a list."""
+    if not os.path.exists(DB_FILE):
         return []
 
+    data = _read_json_list(DB_FILE)
+    if data is not None:
+        return data
+
+    # Writes are atomic, so a broken file means somebody damaged it by hand.
+    # Before giving up I try the backups, newest first.
+    for n in range(1, BACKUP_COUNT + 1):
+        data = _read_json_list(f"{DB_FILE}.bak.{n}")
+        if data is not None:
+            return data
+
+    # If nothing can be read I prefer to start with an empty list.
+    return []
+
+
+def _positions_by_key(bookings):
+    """I build a plain (last_name, code) -> positions dict for replaying."""
+    positions_by_key = {}
+    for position, booking in enumerate(bookings):
+        if isinstance(booking, dict):
+            key = _booking_key(booking.get("last_name", ""),
+                               booking.get("confirmation_code", ""))
+            positions_by_key.setdefault(key, []).append(position)
+    return positions_by_key
+
+
+def _iter_journal(path):
+    """
+    I yield the changes stored in one journal file, in order, as
+    ("add", booking) or ("update", key, fields) tuples.
+
+    Each line is one of
+      {"op": "add", "booking": {...}}
+      {"op": "add_many", "bookings": [{...}, ...]}
+      {"op": "update", "key": [last_name, code], "fields": {...}}
+      {"op": "update_many", "changes": [{"key": [...], "fields": {...}}, ...]}
+
+    A broken last line (crash in the middle of a write) is ignored.
+    """
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except OSError:
+        return
+
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+
+            if entry.get("op") in ("add", "add_many"):
+                if entry.get("op") == "add":
+                    new_bookings = [entry.get("booking")]
+                else:
+                    new_bookings = entry.get("bookings") or []
+                for booking in new_bookings:
+                    if isinstance(booking, dict):
+                        yield ("add", booking)
+
+            elif entry.get("op") in ("update", "update_many"):
+                if entry.get("op") == "update":
+                    changes = [entry]
+                else:
+                    changes = entry.get("changes") or []
+                for change in changes:
+                    key = tuple(change.get("key") or ("", ""))
+                    yield ("update", key, change.get("fields") or {})
+
+
+def _replay_journal(bookings, path, positions_by_key):
+    """
+    I apply the journal lines in path to the bookings list.
+
+    positions_by_key is a small (last_name, code) -> positions dict that
+    I keep up to date while replaying. An "add" whose key is already
+    there is skipped, so replaying a journal that was already folded into
+    the snapshot (crash in the middle of a compaction) does no harm.
+    """
+    for change in _iter_journal(path):
+        if change[0] == "add":
+            booking = change[1]
+            key = _booking_key(booking.get("last_name", ""),
+                               booking.get("confirmation_code", ""))
+            if key in positions_by_key:
+                continue
+            positions_by_key[key] = [len(bookings)]
+            bookings.append(booking)
+        else:
+            _op, key, fields = change
+            positions = positions_by_key.pop(key, [])
+            for position in positions:
+                bookings[position].update(fields)
+                new_key = _booking_key(
+                    bookings[position].get("last_name", ""),
+                    bookings[position].get("confirmation_code", ""))
+                positions_by_key.setdefault(new_key, []).append(position)
+
+
+def _read_bookings_file():
+    """I read the snapshot and replay the journal files on top of it."""
+    bookings = _read_snapshot()
+
+    compacting_path, journal_path = _journal_paths()
+    if not os.path.exists(compacting_path) and not os.path.exists(journal_path):
+        return bookings
+
+    positions_by_key = _positions_by_key(bookings)
+
+    _replay_journal(bookings, compacting_path, positions_by_key)
+    _replay_journal(bookings, journal_path, positions_by_key)
+    return bookings
+
+
+def _iter_json_array(f, chunk_size=64 * 1024):
+    """
+    I yield the items of the JSON list in file f one by one.
+
+    I only keep a small piece of the file in memory: json's raw_decode
+    parses one item from the buffer, and when the item is cut off at the
+    end of the buffer I read the next chunk and try again. If the file is
+    not a list or is broken I simply stop.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    at_end = False
+    expect = "["
+
+    while True:
+        # Skip whitespace and the separator I expect next.
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or at_end:
+                break
+            buffer = f.read(chunk_size)
+            pos = 0
+            at_end = not buffer
+
+        if pos >= len(buffer):
+            return
+        char = buffer[pos]
+        if char == "]" and expect != "[":
+            return
+        if expect:
+            if char != expect:
+                return
+            pos += 1
+            expect = None
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # An item that touches the end of the buffer might be cut off
+            # (a number like 12 of 123), so I only trust it once I saw more.
+            complete = end < len(buffer) or at_end
+            if (complete and not at_end and isinstance(item, (int, float))
+                    and buffer[end] not in ",]" and not buffer[end].isspace()):
+                # A number also stops early inside 1.5e10 when the buffer
+                # ends after "1." or "1.5e", so it is only complete when
+                # a separator follows.
+                complete = False
+        except json.JSONDecodeError:
+            complete = False
+        if not complete:
+            if at_end:
+                return
+            more = f.read(chunk_size)
+            at_end = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        yield item
+        pos = end
+        expect = ","
+        if pos > chunk_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def _patched(booking, key, after, patches_by_key):
+    """
+    I apply the journal updates that came after position 'after' in the
+    journal to one booking, following the key if an update renames it.
+    """
+    while True:
+        for seq, fields in patches_by_key.get(key, ()):
+            if seq > after:
+                break
+        else:
+            return booking
+        booking.update(fields)
+        after = seq
+        key = _booking_key(booking.get("last_name", ""),
+                           booking.get("confirmation_code", ""))
+
+
+def _stream_bookings_file():
+    """
+    I yield the bookings from disk one by one: first bookings.json read
+    piece by piece, then the bookings added in the journal, all with the
+    journal updates applied on the fly.
+
+    Only the journal (which compaction keeps small) is read up front.
+    I open the snapshot while holding the shared lock, so even if it is
+    replaced while I read, I keep reading the same consistent version.
+    """
+    compacting_path, journal_path = _journal_paths()
+    with _file_lock(exclusive=False):
+        try:
+            f = open(DB_FILE, "r", encoding="utf-8")
+        except OSError:
+            f = None
+        changes = list(_iter_journal(compacting_path))
+        changes.extend(_iter_journal(journal_path))
+
+    added = []
+    added_keys = set()
+    patches_by_key = {}
+    for seq, change in enumerate(changes):
+        if change[0] == "add":
+            booking = change[1]
+            key = _booking_key(booking.get("last_name", ""),
+                               booking.get("confirmation_code", ""))
+            added.append((seq, key, booking))
+            added_keys.add(key)
+        else:
+            _op, key, fields = change
+            patches_by_key.setdefault(key, []).append((seq, fields))
+
+    seen_keys = set()
+    if f is not None:
+        with f:
+            for booking in _iter_json_array(f):
+                if not isinstance(booking, dict):
+                    continue
+                key = _booking_key(booking.get("last_name", ""),
+                                   booking.get("confirmation_code", ""))
+                if key in added_keys:
+                    seen_keys.add(key)
+                yield _patched(booking, key, -1, patches_by_key)
+
+    for seq, key, booking in added:
+        # Same rule as the replay: an add that is already there is skipped.
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        yield _patched(booking, key, seq, patches_by_key)
+
+
+def iter_bookings(include_archive=False):
+    """
+    I yield all current bookings one at a time, and with include_archive
+    the archived ones after them (the SQLite backend has no archive, it
+    keeps every booking in its table).
+
+    When the cache is already loaded I just walk the cached list.
+    Otherwise I stream them from disk without building the whole list,
+    so memory stays flat however big bookings.json gets, and a caller
+    that stops early (for example after finding a match) also stops
+    the reading.
+    """
+    if _repository is not None:
+        yield from _repository.iter_all()
+        return
+
+    if include_archive:
+        seen = set()
+        for booking in iter_bookings():
+            seen.add(_booking_key(booking.get("last_name", ""),
+                                  booking.get("confirmation_code", "")))
+            yield booking
+        for booking in iter_archived_bookings():
+            # A crash inside archive_bookings() can leave a booking in both
+            # places until the next run; I only give it once.
+            if _booking_key(booking.get("last_name", ""),
+                            booking.get("confirmation_code", "")) not in seen:
+                yield booking
+        return
+
+    with _lock:
+        bookings = _cache["bookings"] if _cache_in_sync() else None
+
+    if bookings is not None:
+        for booking in bookings:
+            if isinstance(booking, Booking):
+                yield booking.to_dict()
+        return
+
+    yield from _stream_bookings_file()
+
+
+def _iter_records():
+    """
+    I am iter_bookings() for my own read-only loops: from the cache I
+    yield the Booking records themselves instead of dict copies.
+    """
+    with _lock:
+        bookings = _cache["bookings"] if _cache_in_sync() else None
+
+    if bookings is None:
+        return _stream_bookings_file()
+    return (booking for booking in bookings if isinstance(booking, Booking))
+
+
+def _write_temp_file(path, bookings):
+    """
+    I write the full list (normal bookings.json format) into a new temp
+    file next to path, fsync it and return the temp file name.
+
+    json.dump writes the text piece by piece, so the whole file is never
+    built as one big string in memory.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(bookings, f, indent=2, default=_json_default)
+            f.flush()
+            os.fsync(f.fileno())
+            _count_bytes(f.tell())
+    except BaseException:
+        _remove_file(tmp_path)
+        raise
+    return tmp_path
+
+
+def _rotate_backups(path):
+    """I shift path.bak.1 .. path.bak.N by one and keep path as path.bak.1."""
+    if BACKUP_COUNT <= 0 or not os.path.exists(path):
+        return
+
+    for n in range(BACKUP_COUNT - 1, 0, -1):
+        older = f"{path}.bak.{n}"
+        if os.path.exists(older):
+            os.replace(older, f"{path}.bak.{n + 1}")
+
+    newest = f"{path}.bak.1"
+    _remove_file(newest)
+    try:
+        # A hard link costs nothing and path itself never disappears.
+        os.link(path, newest)
+    except OSError:
+        shutil.copy2(path, newest)
+
+
+def _fsync_folder(path):
+    """I fsync the folder of path so a rename inside it survives a crash."""
+    if not hasattr(os, "O_DIRECTORY"):
+        # Windows cannot open folders like this, there is nothing to do.
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _install_file(tmp_path, path):
+    """I atomically replace path with the finished temp file."""
+    _rotate_backups(path)
+    os.replace(tmp_path, path)
+    _fsync_folder(path)
+
+
+def _write_snapshot(path, bookings):
+    """
+    I write the full list in the normal bookings.json format.
+
+    The data goes to a temp file first, gets fsync'd and is then renamed
+    over path. A crash in the middle leaves the old file untouched.
+    """
+    tmp_path = _write_temp_file(path, bookings)
+    try:
+        _install_file(tmp_path, path)
+    except BaseException:
+        _remove_file(tmp_path)
+        raise
+
+
+def _remove_file(path):
+    """I delete a file and do not mind if it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _append_journal(entry):
+    """I append one change to the journal and keep the cache in sync."""
+    _compacting_path, journal_path = _journal_paths()
+    try:
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with open(journal_path, "a+b") as f:
+            # A crash in the middle of an earlier append can leave a torn
+            # last line without its newline. My line must not be glued
+            # onto it, or both would be skipped when reading.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        _count_bytes(len(line))
+    except Exception:
+        invalidate()
+        raise
+
+    # The cached list already holds this change.
+    _cache["signature"] = _current_signature()
+
+    if os.path.getsize(journal_path) >= JOURNAL_COMPACT_BYTES:
+        _start_background_compaction()
+
+
+def _remove_journals():
+    """I delete both journal files once the snapshot holds everything."""
+    for path in _journal_paths():
+        _remove_file(path)
+
+
+def load_bookings():
+    """
+    I load all bookings from the JSON file and always return a list.
+
+    The list comes from my in-memory cache when the file did not change
+    since the last read. It is the cached list itself (no copy), so if
+    you change it you must call save_bookings() afterwards.
+
+    The items are Booking records. They work like dicts for reading and
+    changing fields (get, [], update); use to_dict() for a plain dict.
+
+    With the "sqlite" backend I return a fresh list of dicts from the database.
+    """
+    if _repository is not None:
+        return _repository.load_all()
+
+    with _lock:
+        if _cache_in_sync():
+            _cache_stats["hits"] += 1
+            return _cache["bookings"]
+
+        # A loaded cache that is out of date means somebody else (another
+        # app window, a hand edit) changed the files.
+        changed_elsewhere = (_cache["bookings"] is not None
+                             and _cache["path"] == DB_FILE)
+        with _file_lock(exclusive=False):
+            _cache_stats["misses"] += 1
+            signature = _current_signature()
+            bookings = _to_records(_read_bookings_file())
+            _cache["path"] = DB_FILE
+            _cache["signature"] = signature
+            _cache["bookings"] = bookings
+            _build_indexes(bookings)
+
+    if changed_elsewhere:
+        _record_change("reload", None)
+    return bookings
+
 
+@_write_operation("save_bookings")
 def save_bookings(bookings):
-    """I save the full list of bookings back into the JSON file."""
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(bookings, f, indent=2)
+    """
+    I save the full list of bookings back into the JSON file.
+
+    This works the same for both backends: afterwards bookings.json holds
+    everything, so any journal left over is not needed anymore.
+    """
+    # Called directly (not by add_booking and friends), so neither the
+    # indexes nor the subscribers know what changed, even when it is the
+    # cached list from load_bookings() that was edited in place.
+    called_directly = getattr(_thread_writes, "depth", 0) == 1
+    if called_directly:
+        _record_change("reload", None)
+
+    if _repository is not None:
+        _repository.replace_all(
+            booking.to_dict() if isinstance(booking, Booking) else booking
+            for booking in bookings)
+        return
+
+    rebuild = called_directly or bookings is not _cache["bookings"]
+    if rebuild:
+        # The cache keeps its own records, so later changes to the dicts
+        # passed in here do not leak into it without a save.
+        bookings = [_as_record(booking) for booking in bookings]
+
+    with _file_lock(exclusive=True):
+        try:
+            _write_snapshot(DB_FILE, bookings)
+            _remove_journals()
+        except Exception:
+            # The cached list may already hold changes that never reached
+            # the disk, so I throw it away and read the file next time.
+            invalidate()
+            raise
+
+        # The list I just wrote is exactly what is on disk now,
+        # so I can keep it as the cached copy. My own add/update functions
+        # keep the index up to date themselves, anything else gets a rebuild.
+        if rebuild:
+            _build_indexes(bookings)
+        _cache["path"] = DB_FILE
+        _cache["signature"] = _current_signature()
+        _cache["bookings"] = bookings
+
+
+def set_backend(name):
+    """I switch between the "json", "journal" and "sqlite" storage."""
+    global STORAGE_BACKEND, _repository
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+
+    if _repository is not None:
+        _repository.close()
+        _repository = None
+    if name == "sqlite":
+        _repository = SqliteBookingRepository(SQLITE_FILE)
+        _feed["data_version"] = _repository.data_version()
+    STORAGE_BACKEND = name
+
+
+def _bookings_with_archive(bookings):
+    """
+    I return the archived bookings followed by bookings (the hot ones).
+    A booking that is in both (crash in the middle of archive_bookings())
+    is only kept once, as its hot copy.
+    """
+    hot_keys = {_booking_key(b.get("last_name", ""), b.get("confirmation_code", ""))
+                for b in bookings}
+    archived = [b for b in iter_archived_bookings()
+                if _booking_key(b.get("last_name", ""),
+                                b.get("confirmation_code", "")) not in hot_keys]
+    return archived + list(bookings)
+
+
+def migrate_to_sqlite():
+    """
+    I copy every booking from bookings.json (journal and archive included)
+    into SQLITE_FILE, replacing what was there, and return how many I copied.
+    """
+    with _file_lock(exclusive=False):
+        bookings = _bookings_with_archive(_read_bookings_file())
+    repository = SqliteBookingRepository(SQLITE_FILE)
+    try:
+        repository.replace_all(bookings)
+    finally:
+        repository.close()
+    return len(bookings)
+
+
+def export_bookings(path):
+    """
+    I write all bookings (journal and archive included) to path in
+    bookings.json format.
+    """
+    with _file_lock(exclusive=False):
+        bookings = _bookings_with_archive(load_bookings())
+        _write_snapshot(path, bookings)
+
+
+@_write_operation("compact_journal")
+def compact_journal():
+    """
+    I fold the journal into bookings.json and return True when I did.
+
+    The slow part (reading and writing the whole snapshot) happens
+    without holding the lock, so the app can keep appending to a fresh
+    journal in the meantime. I work on my own copy read from disk, so the
+    cached list is never touched from this thread.
+    """
+    compacting_path, journal_path = _journal_paths()
+
+    # 1. Move the current journal aside so new changes go to a new file.
+    with _file_lock(exclusive=True):
+        _remove_stale_temp_files(DB_FILE)
+        if not os.path.exists(compacting_path):
+            if not os.path.exists(journal_path):
+                return False
+            in_sync = _cache_in_sync()
+            os.replace(journal_path, compacting_path)
+            if in_sync:
+                _cache["signature"] = _current_signature()
+        snapshot_signature = _file_signature(DB_FILE)
+
+    # 2. Build the new snapshot from the old snapshot plus the old journal.
+    bookings = _read_snapshot()
+    positions_by_key = _positions_by_key(bookings)
+    _replay_journal(bookings, compacting_path, positions_by_key)
+    tmp_path = _write_temp_file(DB_FILE, bookings)
+
+    # 3. Swap it in, unless somebody saved the full list in the meantime.
+    with _file_lock(exclusive=True):
+        if (_file_signature(DB_FILE) != snapshot_signature
+                or not os.path.exists(compacting_path)):
+            _remove_file(tmp_path)
+            return False
+        in_sync = _cache_in_sync()
+        _install_file(tmp_path, DB_FILE)
+        os.remove(compacting_path)
+        if in_sync:
+            _cache["signature"] = _current_signature()
+    return True
+
+
+def _process_is_gone(pid):
+    """I check if no process with this pid is running (POSIX only)."""
+    if os.name != "posix":
+        # os.kill(pid, 0) would end the process on Windows, so I cannot
+        # ask there and assume it still runs.
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # It exists, but belongs to somebody else.
+        return False
+    return False
+
+
+def _remove_stale_temp_files(path):
+    """
+    I delete path.tmp.<pid>.<thread> files left behind by app processes
+    that ended in the middle of a write (for example killed while a
+    compaction ran). The caller holds the exclusive lock.
+    """
+    for tmp_path in glob.glob(glob.escape(path) + ".tmp.*.*"):
+        pid = tmp_path[len(path) + len(".tmp."):].split(".")[0]
+        if pid.isdigit() and _process_is_gone(int(pid)):
+            _remove_file(tmp_path)
+
+
+def _start_background_compaction():
+    """I start compact_journal() in a daemon thread unless one is running."""
+    thread = _compaction["thread"]
+    if thread is not None and thread.is_alive():
+        return
+    thread = threading.Thread(target=compact_journal, daemon=True)
+    _compaction["thread"] = thread
+    thread.start()
+
+
+@atexit.register
+def _finish_background_compaction():
+    """
+    I wait for a running compaction when the app exits. Otherwise its
+    daemon thread is killed and leaves a full-size temp file behind.
+    """
+    thread = _compaction["thread"]
+    if thread is not None and thread.is_alive():
+        thread.join()
+
+
+def _archive_path(partition):
+    """I return the archive file of one partition ("YYYY-MM", "long" or "undated")."""
+    return os.path.join(ARCHIVE_DIR, f"bookings-{partition}.json")
+
+
+def _month_of(ordinal):
+    """I return the "YYYY-MM" partition name of a day ordinal."""
+    return date.fromordinal(ordinal).strftime("%Y-%m")
+
+
+def _partition_of(booking):
+    """
+    I return the archive partition of a booking: the month of its
+    check-in, or the long stays shard when its last night is in a later
+    month.
+    """
+    b_in = _booking_ordinal(booking, "check_in")
+    if b_in is None:
+        return "undated"
+    b_out = _booking_ordinal(booking, "check_out")
+    if b_out is not None and _month_of(b_out - 1) > _month_of(b_in):
+        return LONG_STAYS_PARTITION
+    return _month_of(b_in)
+
+
+def _partitions_between(req_in, req_out):
+    """
+    I return the partitions that can hold a stay overlapping the nights
+    [req_in, req_out): one per month of the range, then the long stays.
+    """
+    first = date.fromordinal(req_in).replace(day=1)
+    last = date.fromordinal(max(req_out - 1, req_in))
+    partitions = []
+    while first <= last:
+        partitions.append(first.strftime("%Y-%m"))
+        first = (first + timedelta(days=32)).replace(day=1)
+    partitions.append(LONG_STAYS_PARTITION)
+    return partitions
+
+
+def _iter_partition(partition):
+    """I stream the bookings of one archive file (nothing if it is missing)."""
+    try:
+        f = open(_archive_path(partition), "r", encoding="utf-8")
+    except OSError:
+        return
+    with f:
+        for booking in _iter_json_array(f):
+            if isinstance(booking, dict):
+                yield booking
+
+
+def _is_archivable(booking, today):
+    """I check if a booking is cancelled or its stay ended before today."""
+    if booking.get("status") == "Cancelled":
+        return True
+    b_out = _booking_ordinal(booking, "check_out")
+    return b_out is not None and b_out < today
+
+
+def _read_partition(path):
+    """
+    I read one archive file as a list ([] when it does not exist yet).
+    Like bookings.json I fall back to the backups when it is damaged, but
+    if nothing can be read I raise instead of starting empty, because the
+    caller is about to write the file again.
+    """
+    if not os.path.exists(path):
+        return []
+    for candidate in [path] + [f"{path}.bak.{n}" for n in range(1, BACKUP_COUNT + 1)]:
+        data = _read_json_list(candidate)
+        if data is not None:
+            return data
+    raise ValueError(f"Cannot read archive file {path}")
+
+
+def _archive_index():
+    """I return the archive index (code -> partitions) from archive/index.json."""
+    path = os.path.join(ARCHIVE_DIR, "index.json")
+    with _lock:
+        signature = _file_signature(path)
+        if _archive["path"] == path and _archive["signature"] == signature:
+            return _archive["index"]
+
+        index = {}
+        if signature is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                index = {}
+            if not isinstance(index, dict):
+                index = {}
+
+        numbers = [_sequence_number(code) for code in index]
+        _archive["path"] = path
+        _archive["signature"] = signature
+        _archive["index"] = index
+        _archive["last_sequence"] = max((n for n in numbers if n is not None), default=0)
+        return index
+
+
+def _find_archived(last_name, code):
+    """I look for a booking in the archive files the index points me to."""
+    wanted = _booking_key(last_name, code)
+    for partition in _archive_index().get(wanted[1], []):
+        for booking in _iter_partition(partition):
+            key = _booking_key(booking.get("last_name", ""),
+                               booking.get("confirmation_code", ""))
+            if key == wanted:
+                return booking
+    return None
+
+
+def _archived_unavailable(req_in, req_out):
+    """I return the rooms an archived, non-cancelled stay blocks in [req_in, req_out)."""
+    unavailable = set()
+    for partition in _partitions_between(req_in, req_out):
+        for position, booking in enumerate(_iter_partition(partition)):
+            room_span = _room_span(position, booking)
+            if room_span is None:
+                continue
+            room_number, (b_in, b_out, _position) = room_span
+            if req_in < b_out and req_out > b_in:
+                unavailable.add(room_number)
+    return unavailable
+
+
+def iter_archived_bookings(start=None, end=None):
+    """
+    I yield the archived bookings as dicts, oldest partition first.
+    Reports that also need past and cancelled stays read these next to
+    iter_bookings().
+
+    With start and end ('YYYY-MM-DD') I only open the shards that can
+    overlap those nights and only yield the stays that do.
+    """
+    req_in = _date_ordinal(start)
+    req_out = _date_ordinal(end)
+    if req_in is not None and req_out is not None:
+        for partition in _partitions_between(req_in, req_out):
+            for booking in _iter_partition(partition):
+                b_in = _booking_ordinal(booking, "check_in")
+                b_out = _booking_ordinal(booking, "check_out")
+                if (b_in is not None and b_out is not None
+                        and req_in < b_out and req_out > b_in):
+                    yield booking
+        return
+
+    try:
+        names = sorted(os.listdir(ARCHIVE_DIR))
+    except OSError:
+        return
+    for name in names:
+        if name.startswith("bookings-") and name.endswith(".json"):
+            yield from _iter_partition(name[len("bookings-"):-len(".json")])
+
+
+@_write_operation("archive_bookings")
+def archive_bookings(today=None):
+    """
+    I move cancelled stays and stays that ended before today (a date,
+    default: today) from bookings.json into the monthly archive files
+    and return how many I moved.
+
+    Archived bookings can still be found by find_booking_by_code() and
+    their codes stay reserved, but they cannot be changed any more and
+    searches and logins of current stays never read them.
+
+    The archive files are written before bookings.json. If I crash in
+    between, the next run finds those bookings already archived and only
+    drops them from bookings.json. With the "sqlite" backend I do nothing,
+    its indexes already skip what a query does not ask for.
+    """
+    if _repository is not None:
+        return 0
+    today = (today or date.today()).toordinal()
+
+    with _file_lock(exclusive=True):
+        bookings = load_bookings()
+        keep = []
+        moved = {}
+        for booking in bookings:
+            if isinstance(booking, Booking) and _is_archivable(booking, today):
+                moved.setdefault(_partition_of(booking), []).append(booking)
+            else:
+                keep.append(booking)
+        if not moved:
+            return 0
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        index = {code: list(partitions)
+                 for code, partitions in _archive_index().items()}
+        for partition, records in sorted(moved.items()):
+            path = _archive_path(partition)
+            stored = _read_partition(path)
+            stored_keys = {_booking_key(b.get("last_name", ""),
+                                        b.get("confirmation_code", ""))
+                           for b in stored if isinstance(b, dict)}
+            for booking in records:
+                key = _booking_key(booking.get("last_name", ""),
+                                   booking.get("confirmation_code", ""))
+                if key not in stored_keys:
+                    stored_keys.add(key)
+                    stored.append(booking)
+                partitions = index.setdefault(key[1], [])
+                if partition not in partitions:
+                    partitions.append(partition)
+            _write_snapshot(path, stored)
+
+        _write_snapshot(os.path.join(ARCHIVE_DIR, "index.json"), index)
+        _record_change("reload", None)
+        save_bookings(keep)
+    return len(bookings) - len(keep)
+
+
+def _archive_forever(interval):
+    """I run archive_bookings() every interval seconds (thread body)."""
+    while True:
+        try:
+            archive_bookings()
+        except Exception:
+            # Nothing that goes wrong here should stop the thread for
+            # good; I log it and the next run tries again.
+            traceback.print_exc()
+        time.sleep(interval)
+
+
+def start_archiving(interval=None):
+    """
+    I start a daemon thread that archives past and cancelled bookings now
+    and then every ARCHIVE_INTERVAL_SECONDS (or interval) seconds.
+    Calling me again while it runs does nothing.
+    """
+    thread = _archive["thread"]
+    if thread is not None and thread.is_alive():
+        return
+    thread = threading.Thread(
+        target=_archive_forever,
+        args=(interval or ARCHIVE_INTERVAL_SECONDS,),
+        daemon=True)
+    _archive["thread"] = thread
+    thread.start()
+
+
+def invalidate():
+    """I drop the cached bookings so the next load reads the file again."""
+    _cache["path"] = None
+    _cache["signature"] = None
+    _cache["bookings"] = None
+    _cache["by_code"] = {}
+    _cache["by_room"] = {}
+    _cache["longest_stay"] = {}
+    _cache["by_idempotency"] = {}
+    _cache["codes"] = set()
+    _cache["last_sequence"] = 0
+    _cache["columns"] = None
+    _cache["occupancy"] = None
+    _cache["occupancy_odd"] = {}
+
+
+def _update_event(new_fields):
+    """I name the change an update with new_fields makes."""
+    if new_fields.get("status") == "Cancelled":
+        return "cancel"
+    return "update"
+
+
+def _record_change(event, booking):
+    """
+    I note one change for the subscribers. Inside a write function it
+    waits until the write succeeded, otherwise it goes out right away.
+    """
+    change = (event, booking)
+    if getattr(_thread_writes, "depth", 0):
+        _thread_writes.changes.append(change)
+    else:
+        _publish([change])
+
+
+def _publish(changes):
+    """I give every change a new version and call the subscribers."""
+    for event, booking in changes:
+        with _lock:
+            _feed["version"] += 1
+            change = {"version": _feed["version"], "event": event, "booking": booking}
+            subscribers = list(_feed["subscribers"])
+        for callback, events in subscribers:
+            if events is None or event in events:
+                try:
+                    callback(change)
+                except Exception:
+                    # The change is saved already; a broken subscriber
+                    # must not make it look like it failed.
+                    traceback.print_exc()
+
+
+def version():
+    """
+    I return the change feed version. It goes up with every saved add,
+    update or cancel (and when the files changed behind my back), so a
+    cache can remember it and compare later instead of rescanning.
+    """
+    with _lock:
+        return _feed["version"]
+
+
+def subscribe(callback, events=None, widget=None):
+    """
+    I call callback(change) after every saved change and return a
+    function that unsubscribes again. change is a dict like
+        {"version": 12, "event": "update", "booking": {...}}
+    where event is one of CHANGE_EVENTS. A "reload" has no booking: the
+    files changed in a way I cannot describe one booking at a time
+    (save_bookings(), another app window), so read everything again.
+
+    events limits the callback to some event names. The callback runs
+    on the thread that made the change. Pass a Tk widget as widget to
+    have it run on the Tk mainloop instead: changes then wait in a queue
+    that the widget empties every FEED_POLL_MS, which also checks the
+    files for changes made by other app windows.
+    """
+    events = None if events is None else frozenset(events)
+    if widget is None:
+        entry = (callback, events)
+        with _lock:
+            _feed["subscribers"].append(entry)
+    else:
+        pending = queue.SimpleQueue()
+        entry = (pending.put, events)
+        with _lock:
+            _feed["subscribers"].append(entry)
+
+        def pump():
+            if entry not in _feed["subscribers"]:
+                return
+            try:
+                poll_changes()
+                while True:
+                    try:
+                        change = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        callback(change)
+                    except Exception:
+                        # Same as in _publish: one bad change must not
+                        # end the subscription.
+                        traceback.print_exc()
+            finally:
+                widget.after(FEED_POLL_MS, pump)
+
+        widget.after(FEED_POLL_MS, pump)
+
+    def unsubscribe():
+        with _lock:
+            if entry in _feed["subscribers"]:
+                _feed["subscribers"].remove(entry)
+    return unsubscribe
+
+
+def poll_changes():
+    """
+    I check (one stat per file) whether another app window changed the
+    bookings since I last read them, and if so reload them, which tells
+    the subscribers with a "reload". With SQLite there is nothing to
+    reload, but I still look at PRAGMA data_version to tell them.
+    """
+    if _repository is not None:
+        current = _repository.data_version()
+        with _lock:
+            changed = current != _feed["data_version"]
+            _feed["data_version"] = current
+        if changed:
+            _record_change("reload", None)
+        return
+    with _lock:
+        stale = _cache["bookings"] is not None and not _cache_in_sync()
+    if stale:
+        load_bookings()
+
+
+def cache_stats():
+    """I return a copy of the cache hit/miss counters (handy for checking)."""
+    return dict(_cache_stats)
+
+
+def booking_columns():
+    """
+    I return the column view (BookingColumns) of every booking, archived
+    ones included, for reports like occupancy and revenue, for example:
+        booking_columns().occupied_nights(start_ordinal, end_ordinal)
+
+    I build it once from the archive and the cache; after that add/update
+    keep its rows up to date, so please only read from it. When the
+    archive changed I build it again.
+    With the "sqlite" backend I build a fresh one every time.
+    """
+    if _repository is not None:
+        return _build_columns(_repository.iter_all())
+
+    with _lock:
+        load_bookings()
+        archive_signature = _file_signature(os.path.join(ARCHIVE_DIR, "index.json"))
+        if (_cache["columns"] is None
+                or _cache["columns_archive"] != archive_signature):
+            hot = _cache["by_code"]
+            # Archived rows first, so list position i is always row
+            # columns_offset + i and new bookings are appended at the end.
+            # A booking that is in both places (crash inside
+            # archive_bookings) is only counted in the cached list.
+            archived = (booking for booking in iter_archived_bookings()
+                        if _booking_key(booking.get("last_name", ""),
+                                        booking.get("confirmation_code", ""))
+                        not in hot)
+            columns = _build_columns(archived)
+            _cache["columns_offset"] = len(columns)
+            _cache["columns"] = _build_columns(_cache["bookings"], columns)
+            _cache["columns_archive"] = archive_signature
+        return _cache["columns"]
 
 
 def create_confirmation_code():
@@ -42,58 +1778,392 @@ def create_confirmation_code():
     return code
 
 
-def add_booking(booking_data):
+def _check_character(digits):
     """
-    I add a new booking to the list and return the confirmation code.
+    I compute the Luhn mod 32 check value for a list of digit values.
+    It catches every single wrong character and most swapped neighbours.
+    """
+    base = len(CODE_ALPHABET)
+    factor = 2
+    total = 0
+    for value in reversed(digits):
+        addend = factor * value
+        total += addend // base + addend % base
+        factor = 1 if factor == 2 else 2
+    return (base - total % base) % base
 
-    booking_data is expected to be a simple dict with keys like:
-    first_name, last_name, email, phone, room_type, check_in, nights,
-    breakfast, total_price, status, room_number ...
+
+def create_sequence_code(number):
+    """I turn a running number into a "sequence" style code like S000001Y."""
+    base = len(CODE_ALPHABET)
+    digits = []
+    for _ in range(SEQUENCE_DIGITS):
+        digits.append(number % base)
+        number //= base
+    if number:
+        raise ValueError("Sequence number is too big for a confirmation code")
+    digits.reverse()
+    digits.append(_check_character(digits))
+    return SEQUENCE_PREFIX + "".join(CODE_ALPHABET[d] for d in digits)
+
+
+def _sequence_number(code):
+    """I return the running number of a valid "sequence" code, else None."""
+    if len(code) != len(SEQUENCE_PREFIX) + SEQUENCE_DIGITS + 1:
+        return None
+    if not code.startswith(SEQUENCE_PREFIX):
+        return None
+
+    digits = []
+    for char in code[len(SEQUENCE_PREFIX):]:
+        value = CODE_ALPHABET.find(char)
+        if value < 0:
+            return None
+        digits.append(value)
+
+    if _check_character(digits[:-1]) != digits[-1]:
+        return None
+
+    number = 0
+    for value in digits[:-1]:
+        number = number * len(CODE_ALPHABET) + value
+    return number
+
+
+def _issue_confirmation_codes(count):
     """
-    bookings = load_bookings()
-    code = create_confirmation_code()
+    I make count different confirmation codes that no stored booking uses yet.
+
+    The caller must hold the write lock (or SQLite write transaction) and
+    have the current bookings loaded. A random code that is already taken
+    is simply thrown away and drawn again.
+    """
+    if _repository is not None:
+        code_in_use = _repository.code_exists
+        last_sequence = _repository.last_sequence_number(_sequence_number)
+    else:
+        archived = _archive_index()
+
+        def code_in_use(code):
+            return code in _cache["codes"] or code in archived
+
+        last_sequence = max(_cache["last_sequence"], _archive["last_sequence"])
+
+    codes = []
+    if CODE_SCHEME == "sequence":
+        number = last_sequence
+        while len(codes) < count:
+            number += 1
+            code = create_sequence_code(number)
+            if not code_in_use(code):
+                codes.append(code)
+        return codes
+
+    chosen = set()
+    while len(codes) < count:
+        code = create_confirmation_code()
+        if code not in chosen and not code_in_use(code):
+            chosen.add(code)
+            codes.append(code)
+    return codes
+
+
+def create_idempotency_key():
+    """I create a random key that identifies one booking attempt."""
+    return uuid.uuid4().hex
+
+
+def _prepare_new_booking(booking_data, idempotency_key, code=None):
+    """I give a new booking its code and default fields and return the code."""
+    if code is None:
+        code = _issue_confirmation_codes(1)[0]
     booking_data["confirmation_code"] = code
     # I make sure there are some basic fields so other parts do not crash.
     booking_data.setdefault("status", "Confirmed")
     booking_data.setdefault("created_at", date.today().isoformat())
-    bookings.append(booking_data)
-    save_bookings(bookings)
+    if idempotency_key:
+        booking_data["idempotency_key"] = idempotency_key
     return code
 
 
+@_write_operation("add_booking")
+def add_booking(booking_data, idempotency_key=None):
+    """
+    I add a new booking to the list and return the confirmation code.
+
+    booking_data is expected to be a simple dict with keys like:
+    first_name, last_name, email, phone, room_type, check_in, nights,
+    breakfast, total_price, status, room_number ...
+
+    idempotency_key is optional and names one booking attempt (the app
+    makes one per booking session). If a booking with that key is already
+    saved I do not save it again, I just return the code it got the first
+    time. So showing the confirmation page twice, or trying again after
+    a failed save, never creates a duplicate.
+    """
+    if _repository is not None:
+        if idempotency_key:
+            existing = _repository.find_by_idempotency_key(idempotency_key)
+            if existing is not None:
+                booking_data["confirmation_code"] = existing["confirmation_code"]
+                return existing["confirmation_code"]
+        prepared = {}
+
+        def prepare():
+            prepared["code"] = _prepare_new_booking(booking_data, idempotency_key)
+
+        code = _repository.add(booking_data, prepare=prepare)
+        # Another window may have saved the same attempt first.
+        if code == prepared.get("code"):
+            _record_change("add", dict(booking_data))
+        return code
+
+    with _file_lock(exclusive=True):
+        bookings = load_bookings()
+        if idempotency_key:
+            position = _cache["by_idempotency"].get(idempotency_key)
+            if position is not None:
+                code = bookings[position].get("confirmation_code", "")
+                booking_data["confirmation_code"] = code
+                return code
+
+        code = _prepare_new_booking(booking_data, idempotency_key)
+        bookings.append(Booking.from_dict(booking_data))
+        _index_booking(len(bookings) - 1, bookings[-1])
+        _record_change("add", bookings[-1].to_dict())
+        if STORAGE_BACKEND == "journal":
+            _append_journal({"op": "add", "booking": booking_data})
+        else:
+            save_bookings(bookings)
+    return code
+
+
+def _room_taken(room_number, b_in, b_out):
+    """I check if a stored, non-cancelled stay blocks the room (day ordinals)."""
+    if _repository is not None:
+        return _repository.room_is_booked(
+            room_number,
+            date.fromordinal(b_in).isoformat(),
+            date.fromordinal(b_out).isoformat())
+    return _room_is_blocked(room_number, b_in, b_out)
+
+
+def _prepare_batch(batch):
+    """
+    I check a group of new bookings and, when all of them fit, give them
+    their codes and default fields. I return (ok, results) like
+    add_bookings() does.
+
+    A booking does not fit when its room is already taken for its dates,
+    either by a stored booking or by an earlier booking of the same group.
+    """
+    results = [{"confirmation_code": None, "error": None} for _ in batch]
+    ok = True
+    batch_stays = {}
+
+    for booking, result in zip(batch, results):
+        if not isinstance(booking, dict):
+            result["error"] = "Not a booking record."
+            ok = False
+            continue
+
+        room_span = _room_span(0, booking)
+        if room_span is None:
+            # No room number or no valid dates: nothing to check.
+            continue
+
+        room_number, (b_in, b_out, _position) = room_span
+        stays = batch_stays.setdefault(room_number, [])
+        clash_in_batch = any(b_in < s_out and b_out > s_in for s_in, s_out in stays)
+        if clash_in_batch or _room_taken(room_number, b_in, b_out):
+            result["error"] = (
+                f"Room {room_number} is not free from "
+                f"{booking.get('check_in')} to {booking.get('check_out')}."
+            )
+            ok = False
+        stays.append((b_in, b_out))
+
+    if not ok:
+        return False, results
+
+    codes = _issue_confirmation_codes(len(batch))
+    for booking, result, code in zip(batch, results, codes):
+        _prepare_new_booking(booking, None, code)
+        result["confirmation_code"] = code
+    return True, results
+
+
+@_write_operation("add_bookings")
+def add_bookings(bookings_data):
+    """
+    I add a whole group of bookings (for example an agency block) with a
+    single write and return (ok, results).
+
+    results has one dict per booking, in the same order:
+    {"confirmation_code": "...", "error": None}. It is all or nothing:
+    if one booking cannot be added (its room is already taken for those
+    dates, also by another booking in the group) I save none of them,
+    ok is False and "error" says what is wrong with that booking.
+    If the write itself fails nothing is saved and the error is raised.
+    """
+    batch = list(bookings_data)
+
+    if _repository is not None:
+        outcome = {}
+
+        def prepare():
+            outcome["ok"], outcome["results"] = _prepare_batch(batch)
+            return outcome["ok"]
+
+        _repository.add_many(batch, prepare)
+        if outcome["ok"]:
+            for booking in batch:
+                _record_change("add", dict(booking))
+        return outcome["ok"], outcome["results"]
+
+    with _file_lock(exclusive=True):
+        bookings = load_bookings()
+        ok, results = _prepare_batch(batch)
+        if not ok:
+            return False, results
+
+        start = len(bookings)
+        bookings.extend(Booking.from_dict(booking) for booking in batch)
+        for position in range(start, len(bookings)):
+            _index_booking(position, bookings[position])
+            _record_change("add", bookings[position].to_dict())
+
+        # One journal line for the whole group, so a crash can never
+        # leave half of it behind.
+        if STORAGE_BACKEND == "journal":
+            _append_journal({"op": "add_many", "bookings": batch})
+        else:
+            save_bookings(bookings)
+    return True, results
+
+
 def find_booking_by_code(last_name, code):
     """I find a booking using last name and confirmation code."""
-    bookings = load_bookings()
-    for booking in bookings:
-        ln = str(booking.get("last_name", ""))
-        stored_code = str(booking.get("confirmation_code", ""))
-        if ln.lower() == last_name.lower() and stored_code.upper() == code.upper():
-            return booking
-    return None
+    if _repository is not None:
+        return _repository.find(last_name, code)
+
+    if STREAM_COLD_READS and not _cache_in_sync():
+        wanted = _booking_key(last_name, code)
+        for booking in iter_bookings():
+            key = _booking_key(booking.get("last_name", ""),
+                               booking.get("confirmation_code", ""))
+            if key == wanted:
+                return booking
+        return _find_archived(last_name, code)
+
+    bookings, positions = _find_positions(last_name, code)
+    if positions:
+        return bookings[positions[0]].to_dict()
+    # Past and cancelled stays may have moved to the archive.
+    return _find_archived(last_name, code)
 
 
+@_write_operation("update_booking")
 def update_booking(last_name, code, new_fields):
     """
     I update an existing booking with the values from new_fields.
 
     I return True when something was updated and False otherwise.
     """
-    bookings = load_bookings()
-    updated = False
+    return update_bookings([(last_name, code, new_fields)])[0]
+
 
-    for booking in bookings:
-        ln = str(booking.get("last_name", ""))
-        stored_code = str(booking.get("confirmation_code", ""))
-        if ln.lower() == last_name.lower() and stored_code.upper() == code.upper():
-            for key, value in new_fields.items():
-                booking[key] = value
-            updated = True
+def _persist_updates(bookings, changes):
+    """
+    I save updates that are already applied to the cached list.
 
-    if updated:
+    changes is a list of (key, new_fields) with normalised keys.
+    In journal mode they become one line, otherwise I rewrite the file once.
+    """
+    if STORAGE_BACKEND != "journal":
         save_bookings(bookings)
-    return updated
+    elif len(changes) == 1:
+        key, fields = changes[0]
+        _append_journal({"op": "update", "key": list(key), "fields": fields})
+    else:
+        _append_journal({
+            "op": "update_many",
+            "changes": [{"key": list(key), "fields": fields} for key, fields in changes],
+        })
+
+
+@_write_operation("update_bookings")
+def update_bookings(changes):
+    """
+    I apply many updates in one pass and save them with a single write.
+
+    changes is an iterable of (last_name, code, new_fields). I return a
+    list with True/False for every change, like update_booking() does.
+    """
+    changes = [(_booking_key(last_name, code), new_fields)
+               for last_name, code, new_fields in changes]
+
+    if _repository is not None:
+        results = _repository.update_many(changes)
+        for ((last_name, code), new_fields), ok in zip(changes, results):
+            if ok:
+                _record_change(_update_event(new_fields),
+                               _repository.find(last_name, code))
+        return results
 
+    results = []
+    applied = []
+    with _file_lock(exclusive=True):
+        bookings = load_bookings()
+        for key, new_fields in changes:
+            positions = list(_cache["by_code"].get(key, []))
+            _apply_update(bookings, positions, new_fields)
+            results.append(bool(positions))
+            if positions:
+                applied.append((key, new_fields))
 
+        if applied:
+            _persist_updates(bookings, applied)
+    return results
+
+
+@_write_operation("update_bookings_where")
+def update_bookings_where(predicate, new_fields):
+    """
+    I copy new_fields into every booking for which predicate(booking)
+    is True (for example every stay on a closed floor), save once and
+    return how many bookings I changed.
+
+    predicate gets the stored record: a Booking here, a plain dict with
+    SQLite. Both are full mappings (booking.get("room_number"),
+    booking["status"], iteration, len, ...), so the same predicate works
+    on every backend.
+    """
+    if _repository is not None:
+        count = _repository.update_where(predicate, new_fields)
+        if count:
+            # The repository does not tell me which rows it changed.
+            _record_change("reload", None)
+        return count
+
+    with _file_lock(exclusive=True):
+        bookings = load_bookings()
+        positions = [position for position, booking in enumerate(bookings)
+                     if isinstance(booking, Booking) and predicate(booking)]
+        if not positions:
+            return 0
+
+        # I take the keys before the update, in case it changes them.
+        keys = dict.fromkeys(
+            _booking_key(bookings[p].get("last_name", ""),
+                         bookings[p].get("confirmation_code", ""))
+            for p in positions)
+        _apply_update(bookings, positions, new_fields)
+        _persist_updates(bookings, [(key, new_fields) for key in keys])
+    return len(positions)
+
+
+@_write_operation("cancel_booking")
 def cancel_booking(last_name, code):
     """
     I mark a booking as cancelled.
@@ -104,15 +2174,41 @@ def cancel_booking(last_name, code):
     return update_booking(last_name, code, {"status": "Cancelled"})
 
 
+@_write_operation("cancel_bookings")
+def cancel_bookings(keys):
+    """
+    I cancel many bookings with a single write.
+
+    keys is an iterable of (last_name, code). I return True/False per key.
+    """
+    return update_bookings((last_name, code, {"status": "Cancelled"})
+                           for last_name, code in keys)
+
+
+@_write_operation("cancel_bookings_where")
+def cancel_bookings_where(predicate):
+    """I cancel every booking for which predicate(booking) is True."""
+    return update_bookings_where(predicate, {"status": "Cancelled"})
+
+
 def count_confirmed_by_room_type(room_type):
     """
     I count how many confirmed bookings there are for a specific room_type.
     This is a small helper I can use when I want to know if a room type
-    is already fully booked.
+    is already fully booked. Archived bookings count too, like they do
+    in the SQLite table.
     """
-    bookings = load_bookings()
+    if _repository is not None:
+        return _repository.count_confirmed_by_room_type(room_type)
+
+    # With the bookings loaded anyway, the column view answers this
+    # without touching every record.
+    with _lock:
+        if _cache_in_sync():
+            return booking_columns().count_confirmed(room_type)
+
     count = 0
-    for booking in bookings:
+    for booking in iter_bookings(include_archive=True):
         b_type = str(booking.get("room_type", ""))
         status = booking.get("status", "Confirmed")
         if b_type == room_type and status == "Confirmed":
@@ -122,41 +2218,63 @@ def count_confirmed_by_room_type(room_type):
 
 def get_unavailable_room_numbers(check_in_str, check_out_str):
     """
-    I check all bookings to find which room numbers are occupied
-    during the requested dates.
+    I find which room numbers are occupied during the requested dates.
     I return a set of room_number strings.
+
+    Instead of parsing every booking again I ask the availability index,
+    which only holds confirmed stays and keeps them sorted per room.
+    For stays inside the occupancy horizon (the next OCCUPANCY_DAYS) it is
+    even simpler: one AND of the stay's nights with each room's bitmap,
+    however many old bookings there are.
     """
     unavailable = set()
-    bookings = load_bookings()
 
-    try:
-        req_in = datetime.strptime(check_in_str, "%Y-%m-%d").date()
-        req_out = datetime.strptime(check_out_str, "%Y-%m-%d").date()
-    except ValueError:
+    req_in = _date_ordinal(check_in_str)
+    req_out = _date_ordinal(check_out_str)
+    if req_in is None or req_out is None:
         return unavailable
 
-    for b in bookings:
-        # 1. Ignore cancelled bookings
-        if b.get("status") == "Cancelled":
-            continue
+    if _repository is not None:
+        return _repository.unavailable_room_numbers(
+            date.fromordinal(req_in).isoformat(),
+            date.fromordinal(req_out).isoformat())
 
-        # 2. Check if booking has a room number
-        r_num = b.get("room_number")
-        if not r_num:
-            continue
+    if req_in < date.today().toordinal():
+        # Only stays that ended before today are archived, so the shards
+        # of this range matter only when it starts in the past.
+        unavailable |= _archived_unavailable(req_in, req_out)
 
-        # 3. Check date overlap
-        # Parse booking dates
-        try:
-            b_in = datetime.strptime(b.get("check_in", ""), "%Y-%m-%d").date()
-            b_out = datetime.strptime(b.get("check_out", ""),
-                                      "%Y-%m-%d").date()
-        except ValueError:
-            continue
+    if STREAM_COLD_READS and not _cache_in_sync():
+        for position, booking in enumerate(_iter_records()):
+            room_span = _room_span(position, booking)
+            if room_span is None:
+                continue
+            room_number, (b_in, b_out, _position) = room_span
+            # Overlap Logic: (StartA < EndB) and (EndA > StartB)
+            if req_in < b_out and req_out > b_in:
+                unavailable.add(room_number)
+        return unavailable
 
-        # Overlap Logic: (StartA < EndB) and (EndA > StartB)
-        # This assumes checkout date is the day you leave (room becomes free).
-        if req_in < b_out and req_out > b_in:
-            unavailable.add(str(r_num))
+    # This makes sure the cache (and so the index) matches the file.
+    load_bookings()
+
+    with _lock:
+        _occupancy_ready()
+        start = _cache["occupancy_start"]
+        if start <= req_in < req_out <= start + OCCUPANCY_DAYS:
+            # This assumes checkout date is the day you leave (room becomes free).
+            nights = _stay_bits(req_in, req_out)
+            for room_number, occupied in _cache["occupancy"].items():
+                if occupied & nights:
+                    unavailable.add(room_number)
+            for room_number in _cache["occupancy_odd"]:
+                if _room_is_blocked(room_number, req_in, req_out):
+                    unavailable.add(room_number)
+            return unavailable
+
+    # This assumes checkout date is the day you leave (room becomes free).
+    for room_number in _cache["by_room"]:
+        if _room_is_blocked(room_number, req_in, req_out):
+            unavailable.add(room_number)
 
-    return unavailable
\ No newline at end of file
+    return unavailable
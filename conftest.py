@@ -0,0 +1,5 @@
+# conftest.py
+# pytest finds the tests in tests/ and imports the app modules from here.
+# test_calendar.py is a manual check that opens a Tk window, not a test.
+
+collect_ignore = ["test_calendar.py"]
@@ -25,6 +25,8 @@ from manage_booking_flow import (
     ModifyBookingPage,
     CancelBookingPage
 )
+import booking_storage
+import rooms_data
 
 # =========================================
 # Global Configuration & Color Constants
@@ -1383,5 +1385,9 @@ class TVXKHotelApp(tk.Tk):
 
 
 if __name__ == "__main__":
+    # Past and cancelled bookings move to the archive once a day.
+    booking_storage.start_archiving()
     app = TVXKHotelApp()
+    # Price and inventory edits in rooms_db.json apply without a restart.
+    rooms_data.watch_rooms_file(app)
     app.mainloop()
\ No newline at end of file
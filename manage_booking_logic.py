@@ -3,7 +3,7 @@
 # I keep all the data work here so the Tkinter page can stay a bit cleaner.
 
 import booking_storage
-from rooms_data import ROOMS
+import rooms_data
 
 
 def get_booking(last_name, code):
@@ -18,7 +18,8 @@ def get_booking(last_name, code):
 def _get_price_for_room(room_type):
     """I find the nightly price for a given room type using the ROOMS list."""
     price = 0.0
-    for room in ROOMS:
+    # rooms_data.ROOMS is swapped when rooms_db.json is edited.
+    for room in rooms_data.ROOMS:
         short = str(room.get("short_type", ""))
         if short.lower() == str(room_type).lower():
             try:
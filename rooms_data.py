@@ -3,16 +3,40 @@
 # a simple filter_rooms function that I can call from the filter page.
 # In this version I read the room information from a JSON file so that
 # we can store many physical rooms without hard coding everything.
+#
+# Edits to rooms_db.json are picked up while the app runs: watch_rooms_file()
+# checks the file on the Tk loop and reload_rooms() swaps in the new rooms.
 
 import json
 import os
 import sys
-
-from booking_storage import count_confirmed_by_room_type, get_unavailable_room_numbers
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from booking_storage import (
+    count_confirmed_by_room_type,
+    get_unavailable_room_numbers,
+    poll_changes,
+    version,
+)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOMS_DB_FILE = os.path.join(BASE_DIR, "rooms_db.json")
 
+# How often (in milliseconds) watch_rooms_file() looks at rooms_db.json.
+ROOMS_POLL_MS = 2000
+
+
+def _rooms_file_signature():
+    """I return (mtime_ns, size) of rooms_db.json, or None when it is missing."""
+    try:
+        st = os.stat(ROOMS_DB_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
 
 def _load_rooms_db():
     """
@@ -62,7 +86,12 @@ def _build_capacity(all_rooms):
     return capacity
 
 
-# I load the JSON once when the module is imported.
+# I load the JSON once when the module is imported (and again when it
+# changes, see reload_rooms()).
+_rooms_file = {
+    "signature": _rooms_file_signature(),
+    "thread": None,
+}
 ROOMS = _load_rooms_db()
 # ROOMS now keeps ALL physical rooms (one row per physical room)
 
@@ -129,6 +158,277 @@ if not ROOMS:
     }
 
 
+class RoomView(Mapping):
+    """
+    I am one search result: a read-only view of a room record that reads
+    like the dict it wraps (room["price"], room.get("floor"), ...).
+    Only "name" is different: it also shows the room number, like
+    "Sunset Twin Room (101)", and I build that string only when asked.
+
+    The room index keeps one view per room, so a search hands out the
+    same views again instead of copying every matching room.
+    """
+
+    __slots__ = ("_room",)
+
+    def __init__(self, room):
+        self._room = room
+
+    def __getitem__(self, key):
+        if key == "name":
+            room = self._room
+            return f"{room['name']} ({room.get('room_number', 'N/A')})"
+        return self._room[key]
+
+    def __iter__(self):
+        return iter(self._room)
+
+    def __len__(self):
+        return len(self._room)
+
+    def __repr__(self):
+        return f"RoomView({dict(self)!r})"
+
+
+# Every room gets a bitmask of its attributes, so a filter only needs
+# integer ANDs. The yes/no preferences have fixed bits; every floor and
+# room type value gets its own bit the first time I see it.
+PREFERENCE_BITS = {
+    "Pet": ("pet_friendly", 1 << 0),
+    "Smoke": ("smoking", 1 << 1),
+    "Shuttle": ("shuttle_available", 1 << 2),
+    "Breakfast": ("breakfast_available", 1 << 3),
+}
+
+
+def _build_room_index(all_rooms):
+    """
+    I build the lookup tables filter_rooms uses for all_rooms:
+    - floor_bits / type_bits: floor or short_type value -> its bit
+    - by_bits: bitmask -> positions in all_rooms of the rooms that have
+      exactly these attributes. There are only a few different masks,
+      so a filter checks each mask once instead of every room.
+    - room_bits: the bitmask per position
+    - room_numbers: room_number string per position
+    - views: the RoomView search result per position
+    - prices / price_order: every price in ascending order and the
+      position of the room with that price, so a price range is two
+      bisects
+    """
+    floor_bits = {}
+    type_bits = {}
+    by_bits = {}
+    room_bits = []
+    room_numbers = []
+    priced = []
+    next_bit = 1 << len(PREFERENCE_BITS)
+
+    for position, room in enumerate(all_rooms):
+        bits = 0
+        for field, bit in PREFERENCE_BITS.values():
+            if room.get(field, False):
+                bits |= bit
+
+        for value, table in ((room.get("floor", ""), floor_bits),
+                             (room.get("short_type"), type_bits)):
+            if value not in table:
+                table[value] = next_bit
+                next_bit <<= 1
+            bits |= table[value]
+
+        by_bits.setdefault(bits, []).append(position)
+        room_bits.append(bits)
+        room_numbers.append(str(room.get("room_number", "")))
+        try:
+            price = float(room.get("price", 0.0))
+        except (TypeError, ValueError):
+            price = 0.0
+        priced.append((price, position))
+
+    priced.sort()
+    return {
+        "rooms": all_rooms,
+        "floor_bits": floor_bits,
+        "type_bits": type_bits,
+        "by_bits": by_bits,
+        "room_bits": room_bits,
+        "room_numbers": room_numbers,
+        "views": [RoomView(room) for room in all_rooms],
+        "prices": [price for price, _position in priced],
+        "price_order": [position for _price, position in priced],
+    }
+
+
+def _matching_positions(index, need, any_type, min_price, max_price):
+    """
+    I return the positions (in ROOMS order) of the rooms that match the
+    compiled preferences and the price range.
+
+    With a price range I first cut the price-sorted slice with bisect and
+    only check the bitmasks of the rooms inside it. Without one I take
+    whole groups of rooms that share a matching bitmask.
+    """
+    if min_price is None and max_price is None:
+        positions = []
+        for bits, group in index["by_bits"].items():
+            if bits & need == need and (not any_type or bits & any_type):
+                positions.extend(group)
+    else:
+        prices = index["prices"]
+        lo = 0 if min_price is None else bisect_left(prices, min_price)
+        hi = len(prices) if max_price is None else bisect_right(prices, max_price)
+        room_bits = index["room_bits"]
+        positions = [
+            position for position in index["price_order"][lo:hi]
+            if room_bits[position] & need == need
+            and (not any_type or room_bits[position] & any_type)
+        ]
+
+    # I keep the order of ROOMS, like the old loop over every room did.
+    positions.sort()
+    return positions
+
+
+def _compile_filters(filters_dict, index):
+    """
+    I turn filters_dict into (need, any_type): a room matches when it has
+    every bit of need and, if any_type is not 0, one of its type bits.
+    I return None when no room can match (a floor or types nobody has).
+    """
+    need = 0
+    for name, (_field, bit) in PREFERENCE_BITS.items():
+        if filters_dict.get(name):
+            need |= bit
+
+    floor_pref = filters_dict.get("Floor", "")
+    if floor_pref:
+        if floor_pref not in index["floor_bits"]:
+            return None
+        need |= index["floor_bits"][floor_pref]
+
+    any_type = 0
+    wanted_types = filters_dict.get("Room") or []
+    for short_type in wanted_types:
+        any_type |= index["type_bits"].get(short_type, 0)
+    if wanted_types and not any_type:
+        return None
+
+    return need, any_type
+
+
+def _parse_price(value):
+    """I turn a MinPrice/MaxPrice entry into a number, or None."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _search_key(filters_dict, stay_info, min_price, max_price):
+    """
+    I return the search cache key: the filters in a fixed form (so the
+    order of the room types or "" vs a missing floor do not matter) plus
+    the stay dates.
+    """
+    check_in = check_out = None
+    if stay_info and "check_in" in stay_info and "check_out" in stay_info:
+        check_in = stay_info["check_in"]
+        check_out = stay_info["check_out"]
+    return (
+        tuple(sorted(set(filters_dict.get("Room") or []))),
+        filters_dict.get("Floor", "") or "",
+        tuple(bool(filters_dict.get(name)) for name in PREFERENCE_BITS),
+        min_price,
+        max_price,
+        check_in,
+        check_out,
+    )
+
+
+# The index for ROOMS. It is replaced as a whole, never changed in place.
+_room_index = _build_room_index(ROOMS)
+_rooms_lock = threading.Lock()
+
+
+def set_rooms(all_rooms):
+    """
+    I make all_rooms the room table: I build its capacity and indexes
+    first and then swap ROOMS, ROOM_CAPACITY and the index in one go, so
+    a search running at the same time sees either the old or the new
+    table, never half of each. Read rooms_data.ROOMS (not a copy made by
+    "from rooms_data import ROOMS") to always see the current list.
+    """
+    global ROOMS, ROOM_CAPACITY, _room_index
+    capacity = _build_capacity(all_rooms)
+    index = _build_room_index(all_rooms)
+    with _rooms_lock:
+        ROOMS = all_rooms
+        ROOM_CAPACITY = capacity
+        # filter_rooms reads this once per search, and its cache notices
+        # the new index and starts empty.
+        _room_index = index
+
+
+def reload_rooms():
+    """
+    I load rooms_db.json again if it changed since the last load and
+    return True when I swapped in new rooms.
+
+    A file that is missing, broken or empty (for example half saved by an
+    editor) is ignored; I keep the current rooms and try again after the
+    next change.
+    """
+    signature = _rooms_file_signature()
+    if signature is None or signature == _rooms_file["signature"]:
+        return False
+    _rooms_file["signature"] = signature
+
+    all_rooms = _load_rooms_db()
+    if not all_rooms:
+        return False
+    set_rooms(all_rooms)
+    return True
+
+
+def watch_rooms_file(widget, interval=None):
+    """
+    I check rooms_db.json every ROOMS_POLL_MS (or interval) milliseconds
+    with widget.after() on the Tk loop. That check is one os.stat; when
+    the file changed, reading and indexing it happens in a background
+    thread, so the window never waits for it.
+    """
+    interval = interval or ROOMS_POLL_MS
+
+    def check():
+        thread = _rooms_file["thread"]
+        busy = thread is not None and thread.is_alive()
+        if not busy and _rooms_file_signature() != _rooms_file["signature"]:
+            thread = threading.Thread(target=reload_rooms, daemon=True)
+            _rooms_file["thread"] = thread
+            thread.start()
+        widget.after(interval, check)
+
+    widget.after(interval, check)
+
+
+# The last SEARCH_CACHE_SIZE searches (key from _search_key -> results).
+# They are only valid for one bookings version and one room index, so I
+# empty the cache when either of them changes.
+SEARCH_CACHE_SIZE = 128
+_search_lock = threading.Lock()
+_search_cache = {
+    "entries": OrderedDict(),
+    "version": None,
+    "index": None,
+}
+_search_stats = {
+    "hits": 0,
+    "misses": 0,
+}
+
+
 def filter_rooms(filters_dict, stay_info=None):
     """
     I apply a simple set of filters to the ROOMS list.
@@ -149,16 +449,84 @@ def filter_rooms(filters_dict, stay_info=None):
     - nights
 
     Updated Logic:
-    1. Get occupied room numbers.
-    2. Iterate through ALL physical rooms.
-    3. Skip occupied rooms.
-    4. Apply preferences.
-    5. Return all matching physical rooms (no aggregation/deduplication),
+    1. Take the rooms inside the price range (price index).
+    2. Keep those whose attribute bitmask matches the preferences.
+    3. Only if any are left, get occupied room numbers and skip those.
+    4. Return all matching physical rooms (no aggregation/deduplication),
        so users can see specific available room numbers (e.g., 101, 102).
+
+    The same search again (going back from the guest details page, for
+    example) comes from the search cache, as long as no booking and no
+    room changed in between.
+
+    I return a list of RoomView objects. They read like the room dicts
+    (with the room number in "name") but cannot be changed; use
+    dict(view) for a copy you can change.
     """
+    index = _room_index
+    min_price = _parse_price(filters_dict.get("MinPrice"))
+    max_price = _parse_price(filters_dict.get("MaxPrice"))
+    key = _search_key(filters_dict, stay_info, min_price, max_price)
+
+    # A cheap stat tells me if another app window changed the bookings.
+    poll_changes()
+    bookings_version = version()
+    with _search_lock:
+        if (_search_cache["version"] != bookings_version
+                or _search_cache["index"] is not index):
+            _search_cache["entries"].clear()
+            _search_cache["version"] = bookings_version
+            _search_cache["index"] = index
+        cached = _search_cache["entries"].get(key)
+        if cached is not None:
+            _search_cache["entries"].move_to_end(key)
+            _search_stats["hits"] += 1
+            return list(cached)
+        _search_stats["misses"] += 1
+
+    results = _search_rooms(index, filters_dict, stay_info, min_price, max_price)
+
+    with _search_lock:
+        # If a booking was saved during the search, the cache was (or will
+        # be) cleared for the new version, so I must not store this.
+        if (_search_cache["version"] == bookings_version
+                and _search_cache["index"] is index):
+            entries = _search_cache["entries"]
+            entries[key] = results
+            while len(entries) > SEARCH_CACHE_SIZE:
+                entries.popitem(last=False)
+    return list(results)
+
+
+def search_cache_stats():
+    """I return the hit/miss counters and the hit rate of the search cache."""
+    with _search_lock:
+        hits = _search_stats["hits"]
+        misses = _search_stats["misses"]
+        size = len(_search_cache["entries"])
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "size": size,
+    }
+
+
+def _search_rooms(index, filters_dict, stay_info, min_price, max_price):
+    """I do the real search for filter_rooms (see there)."""
     results = []
 
-    # 1. Get blocked rooms if dates are known
+    compiled = _compile_filters(filters_dict, index)
+    if compiled is None:
+        return results
+    need, any_type = compiled
+
+    positions = _matching_positions(index, need, any_type, min_price, max_price)
+    if not positions:
+        return results
+
+    # The date check is the expensive part, so it runs last.
     blocked_rooms = set()
     if stay_info and "check_in" in stay_info and "check_out" in stay_info:
         blocked_rooms = get_unavailable_room_numbers(
@@ -166,69 +534,18 @@ def filter_rooms(filters_dict, stay_info=None):
             stay_info["check_out"]
         )
 
-    # I try to convert the price range into numbers.
-    min_price = None
-    max_price = None
-    if filters_dict.get("MinPrice"):
-        try:
-            min_price = float(filters_dict["MinPrice"])
-        except ValueError:
-            min_price = None
-
-    if filters_dict.get("MaxPrice"):
-        try:
-            max_price = float(filters_dict["MaxPrice"])
-        except ValueError:
-            max_price = None
-
-    for room in ROOMS:
+    room_numbers = index["room_numbers"]
+    views = index["views"]
+    for position in positions:
         # --- Availability Check ---
         # If this specific physical room is booked, skip it.
-        if str(room.get("room_number", "")) in blocked_rooms:
+        if room_numbers[position] in blocked_rooms:
             continue
 
-        match = True
-
-        wanted_types = filters_dict.get("Room") or []
-        if wanted_types:
-            if room["short_type"] not in wanted_types:
-                match = False
-
-        floor_pref = filters_dict.get("Floor", "")
-        if floor_pref:
-            if room.get("floor", "") != floor_pref:
-                match = False
-
-        if filters_dict.get("Pet"):
-            if not room.get("pet_friendly", False):
-                match = False
-
-        if filters_dict.get("Smoke"):
-            if not room.get("smoking", False):
-                match = False
-
-        if filters_dict.get("Shuttle"):
-            if not room.get("shuttle_available", False):
-                match = False
-
-        if filters_dict.get("Breakfast"):
-            if not room.get("breakfast_available", False):
-                match = False
-
-        price = float(room.get("price", 0.0))
-        if min_price is not None and price < min_price:
-            match = False
-        if max_price is not None and price > max_price:
-            match = False
-
         # No need to check generic capacity here because we checked specific availability above.
 
-        if match:
-            # Make a copy to modify the name for display purposes
-            # showing the room number clearly to the user.
-            room_copy = room.copy()
-            room_number = room.get("room_number", "N/A")
-            room_copy["name"] = f"{room['name']} ({room_number})"
-            results.append(room_copy)
+        # The view shows the room number in its name for the user,
+        # without copying the room.
+        results.append(views[position])
 
     return results
\ No newline at end of file
@@ -0,0 +1,146 @@
+# Behaviour tests for the journal backend of booking_storage: replaying the
+# journal, surviving a crash in the middle of a compaction or an append,
+# and streaming the same bookings the cache holds.
+
+import json
+import os
+
+import pytest
+
+import booking_storage
+
+
+def make_booking(last_name, room_number="101", check_in="2026-11-02",
+                 check_out="2026-11-05"):
+    return {
+        "first_name": "Test",
+        "last_name": last_name,
+        "email": f"{last_name.lower()}@example.com",
+        "room_type": "Suite",
+        "room_number": room_number,
+        "check_in": check_in,
+        "check_out": check_out,
+        "nights": 3,
+        "total_price": 300.0,
+        "status": "Confirmed",
+    }
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """booking_storage with the journal backend on files in tmp_path."""
+    monkeypatch.setattr(booking_storage, "DB_FILE", str(tmp_path / "bookings.json"))
+    monkeypatch.setattr(booking_storage, "SQLITE_FILE", str(tmp_path / "bookings.sqlite3"))
+    monkeypatch.setattr(booking_storage, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    # No background compaction in the middle of a test.
+    monkeypatch.setattr(booking_storage, "JOURNAL_COMPACT_BYTES", 1 << 40)
+    booking_storage.set_backend("journal")
+    booking_storage.invalidate()
+    yield booking_storage
+    booking_storage.invalidate()
+
+
+def reload_from_disk(storage):
+    """I forget the cache, so the next call reads the files again."""
+    storage.invalidate()
+    return storage.load_bookings()
+
+
+def by_code(bookings):
+    return {booking["confirmation_code"]: dict(booking) for booking in bookings}
+
+
+def test_journal_replay_follows_a_rename(storage):
+    code = storage.add_booking(make_booking("Smith"))
+    other = storage.add_booking(make_booking("Jones", room_number="102"))
+    assert storage.update_booking("Smith", code, {"last_name": "Taylor"})
+    # This update only finds the booking under its new name.
+    assert storage.update_booking("Taylor", code, {"breakfast": True})
+
+    reload_from_disk(storage)
+    assert storage.find_booking_by_code("Smith", code) is None
+    found = storage.find_booking_by_code("Taylor", code)
+    assert found["breakfast"] is True
+    assert storage.find_booking_by_code("Jones", other)["room_number"] == "102"
+    assert len(storage.load_bookings()) == 2
+
+
+def test_compaction_folds_the_journal(storage):
+    code = storage.add_booking(make_booking("Smith"))
+    storage.update_booking("Smith", code, {"last_name": "Taylor"})
+
+    assert storage.compact_journal()
+    compacting_path, journal_path = storage._journal_paths()
+    assert not os.path.exists(compacting_path)
+    assert not os.path.exists(journal_path)
+
+    with open(storage.DB_FILE, encoding="utf-8") as f:
+        [stored] = json.load(f)
+    assert stored["last_name"] == "Taylor"
+    assert reload_from_disk(storage)[0]["last_name"] == "Taylor"
+
+
+def test_crash_after_compaction_installed_the_snapshot(storage, monkeypatch):
+    code = storage.add_booking(make_booking("Smith"))
+    other = storage.add_booking(make_booking("Jones", room_number="102"))
+    storage.update_booking("Smith", code, {"last_name": "Taylor"})
+    storage.update_booking("Taylor", code, {"shuttle": True})
+    storage.cancel_booking("Jones", other)
+    expected = by_code(reload_from_disk(storage))
+
+    compacting_path, _journal_path = storage._journal_paths()
+    real_remove = os.remove
+
+    def crash_on_compacting(path, *args, **kwargs):
+        if path == compacting_path:
+            raise KeyboardInterrupt("killed before the journal was removed")
+        return real_remove(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "remove", crash_on_compacting)
+    with pytest.raises(KeyboardInterrupt):
+        storage.compact_journal()
+    monkeypatch.setattr(os, "remove", real_remove)
+
+    # The new snapshot already holds the changes of the compacting journal
+    # that is still there, so replaying it again must not add or undo any.
+    assert os.path.exists(compacting_path)
+    assert by_code(reload_from_disk(storage)) == expected
+    assert by_code(storage._stream_bookings_file()) == expected
+
+    # The next compaction finishes the job.
+    assert storage.compact_journal()
+    assert not os.path.exists(compacting_path)
+    assert by_code(reload_from_disk(storage)) == expected
+
+
+def test_torn_last_line_is_skipped_and_not_glued_to_the_next(storage):
+    code = storage.add_booking(make_booking("Smith"))
+    _compacting_path, journal_path = storage._journal_paths()
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "booking": {"last_name": "Half')
+
+    bookings = reload_from_disk(storage)
+    assert [b["confirmation_code"] for b in bookings] == [code]
+
+    other = storage.add_booking(make_booking("Jones", room_number="102"))
+    bookings = reload_from_disk(storage)
+    assert sorted(b["confirmation_code"] for b in bookings) == sorted([code, other])
+
+
+def test_stream_matches_the_cache(storage):
+    codes = [storage.add_booking(make_booking(f"Guest{i}", room_number=str(100 + i)))
+             for i in range(5)]
+    storage.update_booking("Guest1", codes[1], {"last_name": "Renamed"})
+    storage.cancel_booking("Guest3", codes[3])
+    # Part of the bookings in the snapshot, the rest only in the journal.
+    storage.compact_journal()
+    storage.add_booking(make_booking("Late", room_number="200"))
+    storage.update_booking("Guest2", codes[2], {"breakfast": True})
+
+    storage.load_bookings()
+    from_cache = list(storage.iter_bookings())
+    storage.invalidate()
+    streamed = list(storage.iter_bookings())
+
+    assert streamed == from_cache
+    assert len(streamed) == 6
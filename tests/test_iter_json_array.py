@@ -0,0 +1,69 @@
+# Round-trip tests for booking_storage._iter_json_array: whatever list
+# json.dumps writes must come back item by item, however small the
+# chunks are that the parser reads.
+
+import io
+import json
+import random
+
+import pytest
+
+from booking_storage import _iter_json_array
+
+SAMPLES = [
+    0, -1, 7, 123456789012345678901234567890, 1.5, -0.25, 1e-07, 6.02e23,
+    1.5e10, -3e-300, True, False, None, "", "plain",
+    'quote " and backslash \\ and slash /', "tab\tnew\nline\r",
+    "café 日本 \U0001f600", "\u0000\u001f",
+    "]", "[", ",", "{}", "1.5e",
+    [], {}, [1, [2, [3, []]]], {"a": {"b": {"c": [1.25, "x"]}}},
+    {"last_name": "O'Brien \"Bob\"", "total_price": 1234.5,
+     "nights": 3, "extra": {"notes": ["late \\ check-in", "ü"]}},
+]
+
+
+def parse(text, chunk_size):
+    return list(_iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 9))
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_samples_round_trip(chunk_size, indent, ensure_ascii):
+    text = json.dumps(SAMPLES, indent=indent, ensure_ascii=ensure_ascii)
+    assert parse(text, chunk_size) == SAMPLES
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(8 if depth < 3 else 5)
+    if kind == 0:
+        return rng.randint(-10 ** rng.randint(0, 20), 10 ** rng.randint(0, 20))
+    if kind == 1:
+        return rng.uniform(-1e6, 1e6) * 10 ** rng.randint(-30, 30)
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind in (3, 4):
+        alphabet = 'ab"\\/\n\t,]}[{: é€\U0001f600'
+        return "".join(rng.choice(alphabet) for _ in range(rng.randrange(12)))
+    if kind in (5, 6):
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {f"k{i}": random_value(rng, depth + 1)
+            for i in range(rng.randrange(4))}
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_lists_round_trip(seed):
+    rng = random.Random(seed)
+    items = [random_value(rng) for _ in range(rng.randrange(1, 20))]
+    text = json.dumps(items, indent=rng.choice([None, 1]),
+                      ensure_ascii=rng.choice([True, False]))
+    for chunk_size in (1, 2, 3, 5, 8, 64):
+        assert parse(text, chunk_size) == items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_not_a_list_or_broken(chunk_size):
+    assert parse("", chunk_size) == []
+    assert parse('{"a": 1}', chunk_size) == []
+    # A cut off file yields the items before the broken one.
+    assert parse('[1, {"a": 2}, {"b": ', chunk_size) == [1, {"a": 2}]